@@ -0,0 +1,236 @@
+"""
+Micro-benchmarks offline dos caminhos quentes do bot: parsing dos feeds, limpeza de
+despesas, filtragem do histórico de notícias e formatação das threads.
+
+Roda sem rede, a partir das fixtures em benchmarks/fixtures, e emite JSON para que os
+resultados possam ser comparados entre commits.
+
+Uso:
+    python -m benchmarks.run_benchmarks --output resultados.json
+    python -m benchmarks.run_benchmarks --compare resultados_anteriores.json
+    python -m benchmarks.run_benchmarks --record    # regrava as fixtures a partir das fontes reais
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+EXPENSES_FIXTURE = os.path.join(FIXTURES_DIR, "camara_despesas_pagina.json")
+EXPENSES_FIXTURE_DEPUTY = 204554
+
+# fonte -> (módulo do coletor, função de coleta, constante com a URL do feed)
+COLLECTORS = {
+    "senado": ("src.coletores.coleta_senado", "fetch_senado_news", "SENADO_NEWS_RSS_URL"),
+    "camara": ("src.coletores.coleta_camara", "fetch_camara_news", "CAMARA_NEWS_RSS_URL"),
+    "stf": ("src.coletores.coleta_stf", "fetch_stf_news", "STF_NEWS_RSS_URL"),
+    "tse": ("src.coletores.coleta_tse", "fetch_tse_news", "TSE_NEWS_RSS_URL"),
+    "agenciabrasil": ("src.coletores.coleta_agenciabrasil", "fetch_agenciabrasil_news",
+                      "AGENCIABRASIL_NEWS_RSS_URL"),
+}
+
+# Notícias novas simuladas no benchmark de leitura incremental dos feeds
+NEW_ENTRIES = 3
+
+# Regressão sinalizada no --compare quando a vazão cai abaixo desta fração da anterior
+REGRESSION_RATIO = 0.9
+
+
+class _FixtureResponse:
+    """Resposta HTTP mínima servida a partir de uma fixture."""
+    status_code = 200
+    headers = {}
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+def _feed_fixture(source):
+    return os.path.join(FIXTURES_DIR, f"rss_{source}.xml")
+
+
+def measure(name, func, n, repeat):
+    """Executa func `repeat` vezes; n é a quantidade de itens processados por execução."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {"nome": name, "n": n, "repeticoes": repeat, "melhor_s": min(times),
+            "mediana_s": median, "itens_por_s": n / median if median else None}
+
+
+def bench_feed_parsing(repeat, calls=20):
+    results = []
+    for source, (module_name, func_name, url_name) in COLLECTORS.items():
+        module = importlib.import_module(module_name)
+        with open(_feed_fixture(source), "rb") as f:
+            content = f.read()
+        fetch = getattr(module, func_name)
+        with mock.patch.object(module, "conditional_get",
+                               return_value=(_FixtureResponse(content), None)), \
+                mock.patch.object(module, "store_feed"), \
+                mock.patch("src.coletores.cache_feeds._load_cache", return_value={}):
+            news = fetch()
+            entries = len(news)
+            results.append(measure(f"feed.parse.{source}",
+                                   lambda: [fetch() for _ in range(calls)],
+                                   entries * calls, repeat))
+        # Leitura seguinte com NEW_ENTRIES notícias novas: para na primeira já vista
+        url = getattr(module, url_name)
+        with mock.patch.object(module, "conditional_get",
+                               return_value=(_FixtureResponse(content), None)), \
+                mock.patch.object(module, "store_feed"), \
+                mock.patch("src.coletores.cache_feeds._load_cache",
+                           return_value={url: {"news": news[NEW_ENTRIES:]}}):
+            results.append(measure(f"feed.parse_incremental.{source}",
+                                   lambda: [fetch() for _ in range(calls)],
+                                   entries * calls, repeat))
+    return results
+
+
+def _expense_rows(total):
+    with open(EXPENSES_FIXTURE, encoding="utf-8") as f:
+        page = json.load(f)["dados"]
+    return (page * (total // len(page) + 1))[:total]
+
+
+def bench_clean_expense(repeat, total=100_000):
+    from src.sync_data import clean_expense
+    rows = _expense_rows(total)
+    return [measure("sync.clean_expense", lambda: [clean_expense(e, EXPENSES_FIXTURE_DEPUTY, 2026, 9)
+                                                   for e in rows], total, repeat)]
+
+
+def bench_posted_history(repeat, sizes=(1_000, 10_000, 100_000), candidates=200):
+    from src.analisador.analisador_noticias import (PostedIndex, filter_new_articles,
+                                                    prune_old_posted_articles)
+    results = []
+    now = datetime.now(timezone.utc)
+    for size in sizes:
+        index = PostedIndex()
+        for i in range(size):
+            # Histórico espalhado por 30 dias; a poda padrão descarta os mais antigos
+            index.add(f"https://www12.senado.leg.br/noticias/materias/{i}",
+                      now - timedelta(days=i * 30 / size))
+        state = index.to_state()
+        fetched = [{"title": f"Notícia {i}", "summary": "",
+                    "link": f"https://www12.senado.leg.br/noticias/materias/{i * (size // candidates)}"
+                            + ("?utm_source=rss" if i % 2 else "")}
+                   for i in range(candidates)]
+        fetched += [{"title": f"Nova {i}", "summary": "", "link": f"https://agenciabrasil.ebc.com.br/n/{i}"}
+                    for i in range(candidates)]
+        pruned = prune_old_posted_articles(state)
+        results.append(measure(f"noticias.prune_old_posted_articles.{size}",
+                               lambda: prune_old_posted_articles(state), size, repeat))
+        results.append(measure(f"noticias.filter_new_articles.{size}",
+                               lambda: filter_new_articles(fetched, pruned), len(fetched), repeat))
+    return results
+
+
+def bench_format_thread(repeat, rounds=50):
+    from src.formatadores.formatador_noticias import format_news_thread
+    import xml.etree.ElementTree as ET
+    articles = []
+    for source in COLLECTORS:
+        for item in ET.parse(_feed_fixture(source)).getroot().iter("item"):
+            articles.append({"title": item.findtext("title", ""), "link": item.findtext("link", ""),
+                             "summary": item.findtext("description", "")})
+    return [measure("formatador.format_news_thread",
+                    lambda: [format_news_thread(a) for _ in range(rounds) for a in articles],
+                    len(articles) * rounds, repeat)]
+
+
+def record_fixtures():
+    """Baixa os feeds reais e uma página de despesas da Câmara para regravar as fixtures."""
+    import requests
+    for source, (module_name, _, url_name) in COLLECTORS.items():
+        module = importlib.import_module(module_name)
+        response = requests.get(getattr(module, url_name), headers=getattr(module, "HEADERS", {}),
+                                timeout=30)
+        response.raise_for_status()
+        with open(_feed_fixture(source), "wb") as f:
+            f.write(response.content)
+        print(f"Fixture regravada: rss_{source}.xml ({len(response.content)} bytes)")
+
+    last_month = datetime.now().replace(day=1) - timedelta(days=1)
+    response = requests.get(
+        f"https://dadosabertos.camara.leg.br/api/v2/deputados/{EXPENSES_FIXTURE_DEPUTY}/despesas",
+        params={"ano": last_month.year, "mes": last_month.month, "itens": 100},
+        headers={"Accept": "application/json"}, timeout=30)
+    response.raise_for_status()
+    with open(EXPENSES_FIXTURE, "w", encoding="utf-8") as f:
+        json.dump(response.json(), f, ensure_ascii=False, indent=1)
+    print("Fixture regravada: camara_despesas_pagina.json")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous_path):
+    """Imprime a variação de vazão de cada benchmark em relação a um resultado anterior."""
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {r["nome"]: r for r in json.load(f)["resultados"]}
+    regressions = 0
+    for result in current["resultados"]:
+        before = previous.get(result["nome"])
+        if not before or not before.get("itens_por_s") or not result.get("itens_por_s"):
+            continue
+        ratio = result["itens_por_s"] / before["itens_por_s"]
+        flag = "  <-- REGRESSÃO" if ratio < REGRESSION_RATIO else ""
+        regressions += bool(flag)
+        print(f"{result['nome']:<50} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: stdout).")
+    parser.add_argument("--compare", help="Resultado JSON anterior para comparação.")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetições por benchmark.")
+    parser.add_argument("--record", action="store_true", help="Regrava as fixtures (requer rede).")
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures()
+        return
+
+    # Os módulos registram cada notícia em INFO; isso distorceria as medições
+    logging.disable(logging.INFO)
+    results = {
+        "gerado_em": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "resultados": (bench_feed_parsing(args.repeat) + bench_clean_expense(args.repeat)
+                       + bench_posted_history(args.repeat) + bench_format_thread(args.repeat)),
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare and compare(results, args.compare):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
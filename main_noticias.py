@@ -1,51 +1,134 @@
 import logging
+import os
 import sys
-import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from src.coletores.coleta_senado import fetch_senado_news
 from src.coletores.coleta_camara import fetch_camara_news
 from src.coletores.coleta_stf import fetch_stf_news
 from src.coletores.coleta_tse import fetch_tse_news
 from src.coletores.coleta_agenciabrasil import fetch_agenciabrasil_news
-from src.analisador.analisador_noticias import prune_old_posted_articles, filter_new_articles
+from src.analisador.analisador_noticias import (POSTED_DAYS_TO_KEEP, prune_old_posted_articles,
+                                                filter_new_articles)
+from src.analisador.similaridade import SimilarityIndex
+from src.coletores.enriquecimento import enrich_articles
 from src.formatadores.formatador_noticias import format_news_thread
 from src.api_client import SentinelAPIClient
+from src.metricas import metrics
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
+# Fontes na ordem em que as notícias são concatenadas
+NEWS_SOURCES = [
+    ("senado", fetch_senado_news),
+    ("camara", fetch_camara_news),
+    ("stf", fetch_stf_news),
+    ("tse", fetch_tse_news),
+    ("agenciabrasil", fetch_agenciabrasil_news),
+]
+# Prazo total (s) para a coleta de todos os feeds no ciclo
+FEEDS_DEADLINE = float(os.environ.get("FEEDS_DEADLINE", "20"))
+
+def _timed(fetch):
+    start = time.monotonic()
+    try:
+        items = fetch()
+    except Exception as e:
+        logging.error(f"Falha inesperada no coletor: {e}")
+        items = None
+    # Os coletores retornam None em falha: distingue uma fonte com erro de um feed vazio
+    if items is None: return [], "erro", time.monotonic() - start
+    return items, "ok", time.monotonic() - start
+
+def collect_news(deadline=FEEDS_DEADLINE, sources=None):
+    """Busca os feeds (todos, ou só `sources`) em paralelo sob um prazo único.
+
+    Fontes que falham ou estouram o prazo são descartadas no ciclo.
+    Retorna (notícias, relatório por fonte com status, latência e notícias da fonte).
+    """
+    sources = [(name, fetch) for name, fetch in NEWS_SOURCES if sources is None or name in sources]
+    if not sources: return [], {}
+    start = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=len(sources))
+    futures = {name: pool.submit(_timed, fetch) for name, fetch in sources}
+    done, _ = wait(futures.values(), timeout=deadline)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    news, report = [], {}
+    for name, future in futures.items():
+        if future in done:
+            items, status, latency = future.result()
+            if status == "ok" and not items: status = "vazio"
+            news.extend(items)
+        else:
+            items, status, latency = [], "timeout", time.monotonic() - start
+        report[name] = {"status": status, "latencia": round(latency, 3), "noticias": items}
+        metrics.observe("feed_fetch_seconds", latency, fonte=name)
+        metrics.inc("feed_fetch_total", fonte=name, status=status)
+        logging.info(f"Fonte {name}: {status} em {latency:.2f}s")
+
+    logging.info(f"Coleta concluída em {time.monotonic() - start:.2f}s: {len(news)} notícias.")
+    return news, report
+
 def get_posted(client):
-    res = client.db.table("bot_state").select("value").eq("key", "posted_news").execute()
-    return res.data[0]["value"] if res.data else []
+    return client.state.get("posted_news") or []
 
-def run_news_bot():
-    """Executa o fluxo de notícias. Retorna True se postou algo."""
-    client = SentinelAPIClient()
-    if not client.db: return False
+def run_news_bot(client=None, news=None):
+    """Executa o fluxo de notícias. Retorna True se postou algo.
 
-    history = prune_old_posted_articles(get_posted(client))
-    news = (fetch_senado_news() + fetch_camara_news() + fetch_stf_news() + 
-            fetch_tse_news() + fetch_agenciabrasil_news())
+    Sem um cliente, cria o próprio e grava o estado ao final; com um cliente
+    compartilhado, a gravação do estado fica a cargo de quem o criou. `news`
+    permite passar notícias já coletadas (modo serviço) em vez de buscar os feeds.
+    """
+    if client is None:
+        client = SentinelAPIClient()
+        if not client.db: return False
+        try:
+            return run_news_bot(client, news)
+        finally:
+            client.publishers.wait()
+            client.state.commit()
 
-    new_items = filter_new_articles(news, history)
+    if news is None:
+        with metrics.span("noticias.collect"):
+            news, _ = collect_news()
+
+    with metrics.span("noticias.filter"):
+        history = prune_old_posted_articles(get_posted(client))
+        similar = SimilarityIndex.from_state(client.state.get("posted_minhash")).prune(POSTED_DAYS_TO_KEEP)
+        new_items = filter_new_articles(news, history, similar)
+    metrics.inc("news_candidates_total", len(new_items))
     if not new_items:
-        client.db.table("bot_state").upsert({"key": "posted_news", "value": history}).execute()
+        client.state.set("posted_news", history.to_state())
+        client.state.set("posted_minhash", similar.to_state())
         return False
 
+    with metrics.span("noticias.enrich"):
+        enrich_articles(new_items)
+
     target = new_items[0]
     logging.info(f"Postando notícia: {target['title']}")
-    status = client.post_tweet_thread(format_news_thread(target))
+    with metrics.span("noticias.format"):
+        thread = format_news_thread(target)
+    with metrics.span("noticias.post"):
+        status = client.publish_thread(thread, origem="noticia")
     
-    if status not in ["rate_limit", "duplicate", None]:
-        history.append({
-            'link': target['link'],
-            'posted_at': datetime.datetime.now(datetime.timezone.utc).isoformat()
-        })
-        client.db.table("bot_state").upsert({"key": "posted_news", "value": history}).execute()
+    if status:
+        history.add(target['link'])
+        similar.add(target)
+        client.state.set("posted_news", history.to_state())
+        client.state.set("posted_minhash", similar.to_state())
+        # Grava já: a thread está nos outboxes e não pode ser enfileirada de novo no próximo ciclo
+        client.state.commit()
         return True
     
     return False
 
 def main():
-    run_news_bot()
+    try:
+        run_news_bot()
+    finally:
+        metrics.export("noticias")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
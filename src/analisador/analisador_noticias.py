@@ -1,47 +1,133 @@
 """Módulo para análise e filtragem de notícias."""
+import base64
+import hashlib
 import logging
 from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from src.analisador.similaridade import near_duplicate_report
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-def prune_old_posted_articles(posted_articles, days_to_keep=3):
+# Dias de histórico mantidos no índice de links postados
+POSTED_DAYS_TO_KEEP = 21
+# Parâmetros de rastreamento ignorados ao comparar URLs
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_", "cmpid", "at_medium", "at_campaign")
+HASH_SIZE = 8
+
+
+def canonicalize_url(link):
     """
-    Remove notícias antigas da lista de artigos já postados.
+    Normaliza uma URL para deduplicação: https, host minúsculo sem "www.", sem fragmento,
+    sem barra final e sem parâmetros de rastreamento (demais parâmetros ordenados).
+    """
+    parts = urlsplit(link.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not k.lower().startswith(TRACKING_PARAMS))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, urlencode(query), ""))
 
-    Args:
-        posted_articles (list): Lista de dicionários, cada um com 'link' e 'posted_at'.
-        days_to_keep (int): Número de dias para manter um artigo na lista.
 
-    Returns:
-        list: A lista de artigos postados, mas sem os antigos.
+def link_hash(link):
+    """Hash de 8 bytes da URL canônica."""
+    return hashlib.blake2b(canonicalize_url(link).encode("utf-8"), digest_size=HASH_SIZE).digest()
+
+
+class PostedIndex:
     """
-    if not posted_articles:
-        return []
+    Índice compacto de links já postados.
 
-    pruned_list = []
-    cutoff_date = datetime.now(timezone.utc) - timedelta(days=days_to_keep)
+    Guarda hashes de 8 bytes das URLs canônicas agrupados pelo dia (UTC) da postagem:
+    a consulta é O(1) e a expiração descarta dias inteiros. Serializado, cada dia vira
+    uma única string base64 com os hashes concatenados (~11 caracteres por link).
+    """
 
-    for article in posted_articles:
-        # Usamos o fromisoformat para converter a data de volta para um objeto datetime
-        # Assumimos que a data foi salva no formato ISO 8601 com timezone
-        posted_date = datetime.fromisoformat(article['posted_at'])
-        if posted_date >= cutoff_date:
-            pruned_list.append(article)
+    def __init__(self):
+        self._days = {}
+        self._seen = {}
+
+    @classmethod
+    def from_state(cls, value):
+        """Constrói o índice a partir do bot_state, aceitando o formato legado (lista de dicts)."""
+        index = cls()
+        if isinstance(value, dict):
+            for day, packed in value.get("dias", {}).items():
+                raw = base64.b64decode(packed)
+                for i in range(0, len(raw), HASH_SIZE):
+                    index._add_hash(raw[i:i + HASH_SIZE], day)
         else:
-            logging.info("Removendo artigo antigo da lista de estado: %s", article['link'])
+            for article in value or []:
+                index.add(article['link'], datetime.fromisoformat(article['posted_at']))
+        return index
+
+    def to_state(self):
+        return {"v": 1, "dias": {day: base64.b64encode(b"".join(sorted(hashes))).decode("ascii")
+                                 for day, hashes in sorted(self._days.items())}}
+
+    def _add_hash(self, digest, day):
+        self._days.setdefault(day, set()).add(digest)
+        self._seen[digest] = day
+
+    def add(self, link, posted_at=None):
+        posted_at = posted_at or datetime.now(timezone.utc)
+        self._add_hash(link_hash(link), posted_at.astimezone(timezone.utc).date().isoformat())
+
+    def __contains__(self, link):
+        return self.has_hash(link_hash(link))
 
-    return pruned_list
+    def has_hash(self, digest):
+        return digest in self._seen
 
+    def __len__(self):
+        return len(self._seen)
 
-def filter_new_articles(all_fetched_articles, posted_articles):
+    def prune(self, days_to_keep=POSTED_DAYS_TO_KEEP):
+        """Descarta os dias mais antigos que days_to_keep."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days_to_keep)).date().isoformat()
+        for day in [d for d in self._days if d < cutoff]:
+            for digest in self._days.pop(day):
+                if self._seen.get(digest) == day:
+                    del self._seen[digest]
+            logging.info("Removendo do índice de links os artigos postados em %s.", day)
+        return self
+
+
+def prune_old_posted_articles(posted_articles, days_to_keep=POSTED_DAYS_TO_KEEP):
+    """
+    Remove notícias antigas do histórico de artigos já postados.
+
+    Args:
+        posted_articles (PostedIndex | dict | list): O índice, sua forma serializada no
+            bot_state ou a lista legada de dicionários com 'link' e 'posted_at'.
+        days_to_keep (int): Número de dias para manter um artigo no histórico.
+
+    Returns:
+        PostedIndex: O índice de artigos postados, sem os dias antigos.
+    """
+    if not isinstance(posted_articles, PostedIndex):
+        posted_articles = PostedIndex.from_state(posted_articles)
+    return posted_articles.prune(days_to_keep)
+
+
+def filter_new_articles(all_fetched_articles, posted_articles, similarity_index=None):
     """
     Filtra uma lista de notícias, retornando apenas as que ainda não foram postadas.
 
+    URLs são comparadas na forma canônica, então variações http/https ou com
+    parâmetros de rastreamento não escapam da deduplicação.
+
+    Com um índice de similaridade, também descarta a mesma história publicada por
+    outra fonte com URL diferente (quase duplicatas de notícias já postadas ou de
+    candidatas anteriores no mesmo ciclo).
+
     Args:
         all_fetched_articles (list): Lista de todas as notícias buscadas nos feeds.
-        posted_articles (list): A lista (já limpa de antigos) de artigos postados.
+        posted_articles (PostedIndex | list): O histórico (já limpo de antigos) de artigos postados.
+        similarity_index (SimilarityIndex, opcional): Índice MinHash das notícias postadas.
 
     Returns:
         list: Uma lista de notícias que são novas e prontas para serem postadas.
@@ -49,13 +135,23 @@ def filter_new_articles(all_fetched_articles, posted_articles):
     if not all_fetched_articles:
         return []
 
-    posted_links = {article['link'] for article in posted_articles}
+    if not isinstance(posted_articles, PostedIndex):
+        posted_articles = PostedIndex.from_state(posted_articles)
     new_articles = []
+    batch_hashes = set()
 
     for article in all_fetched_articles:
-        if article['link'] not in posted_links:
+        digest = link_hash(article['link'])
+        # Também descarta a mesma URL repetida entre feeds no mesmo ciclo
+        if not posted_articles.has_hash(digest) and digest not in batch_hashes:
+            batch_hashes.add(digest)
             new_articles.append(article)
 
+    if similarity_index is not None:
+        duplicates = {id(entry['article']) for entry in
+                      near_duplicate_report(new_articles, similarity_index)}
+        new_articles = [article for article in new_articles if id(article) not in duplicates]
+
     logging.info("Filtragem concluída. %d novas notícias encontradas.", len(new_articles))
     # A lista de notícias do feed já vem em ordem cronológica (mais novas primeiro)
     return new_articles
@@ -0,0 +1,160 @@
+"""Detecção de notícias quase duplicadas entre fontes (MinHash + LSH)."""
+import base64
+import hashlib
+import html
+import logging
+import os
+import random
+import re
+import struct
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Similaridade de Jaccard estimada a partir da qual duas notícias são a mesma história
+NEAR_DUP_THRESHOLD = float(os.environ.get("NEAR_DUP_THRESHOLD", "0.4"))
+NUM_PERM = 64
+SHINGLE_SIZE = 2
+_MASK = (1 << 64) - 1
+
+STOPWORDS = frozenset(
+    "a o as os de da do das dos e em no na nos nas um uma uns umas por para com sem "
+    "que se ao aos à às pelo pela pelos pelas ou mas como mais sobre entre até após "
+    "sua seu suas seus é foi ser são diz afirma".split()
+)
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"\w+")
+
+_rng = random.Random(20240501)
+_PERMUTATIONS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(NUM_PERM)]
+
+
+def _tokens(text):
+    """Minúsculas, sem HTML, acentos e palavras vazias."""
+    text = html.unescape(_TAG_RE.sub(" ", text or "")).lower()
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return [w for w in _WORD_RE.findall(text) if w not in STOPWORDS]
+
+
+def shingles(article):
+    """Conjunto de shingles de palavras do título e do resumo da notícia."""
+    words = _tokens(article.get('title', '')) + _tokens(article.get('summary', ''))
+    if len(words) < SHINGLE_SIZE:
+        return set(words)
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def signature(article):
+    """Assinatura MinHash (NUM_PERM valores de 32 bits) da notícia."""
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+              for s in shingles(article)]
+    if not hashes:
+        return None
+    return tuple(min(((a * h + b) & _MASK) >> 32 for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def _choose_bands(threshold):
+    """Escolhe (bandas, linhas) cujo limiar do LSH fica um pouco abaixo do desejado (favorece recall)."""
+    target = threshold * 0.8
+    options = [(b, NUM_PERM // b) for b in range(1, NUM_PERM + 1) if NUM_PERM % b == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - target))
+
+
+class SimilarityIndex:
+    """
+    Índice LSH de assinaturas MinHash das notícias já postadas.
+
+    As assinaturas são divididas em bandas; duas notícias que coincidem em ao menos uma
+    banda são candidatas e têm a similaridade estimada pela fração de valores iguais.
+    A consulta custa um acesso a dicionário por banda, independente do tamanho do histórico.
+    """
+
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+        self.bands, self.rows = _choose_bands(threshold)
+        self._items = {}
+        self._buckets = {}
+
+    @classmethod
+    def from_state(cls, value, threshold=NEAR_DUP_THRESHOLD):
+        index = cls(threshold)
+        for item in (value or {}).get("itens", []):
+            sig = struct.unpack(f"<{NUM_PERM}I", base64.b64decode(item["sig"]))
+            index._insert(sig, item["link"], item["titulo"], item["dia"])
+        return index
+
+    def to_state(self):
+        return {"v": 1, "itens": [
+            {"link": item["link"], "titulo": item["titulo"], "dia": item["dia"],
+             "sig": base64.b64encode(struct.pack(f"<{NUM_PERM}I", *sig)).decode("ascii")}
+            for sig, item in self._items.items()
+        ]}
+
+    def _band_keys(self, sig):
+        r = self.rows
+        return [(i, sig[i * r:(i + 1) * r]) for i in range(self.bands)]
+
+    def _insert(self, sig, link, title, day):
+        self._items[sig] = {"link": link, "titulo": title, "dia": day}
+        for key in self._band_keys(sig):
+            self._buckets.setdefault(key, set()).add(sig)
+
+    def add(self, article, posted_at=None):
+        sig = signature(article)
+        if sig is None:
+            return
+        day = (posted_at or datetime.now(timezone.utc)).astimezone(timezone.utc).date().isoformat()
+        self._insert(sig, article['link'], article.get('title', '')[:120], day)
+
+    def query(self, article):
+        """Retorna (item postado, similaridade) da melhor colisão acima do limiar, ou None."""
+        sig = signature(article)
+        if sig is None:
+            return None
+        candidates = set()
+        for key in self._band_keys(sig):
+            candidates.update(self._buckets.get(key, ()))
+        best = None
+        for other in candidates:
+            similarity = sum(x == y for x, y in zip(sig, other)) / NUM_PERM
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (self._items[other], similarity)
+        return best
+
+    def prune(self, days_to_keep):
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days_to_keep)).date().isoformat()
+        for sig in [s for s, item in self._items.items() if item["dia"] < cutoff]:
+            del self._items[sig]
+            for key in self._band_keys(sig):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(sig)
+                    if not bucket:
+                        del self._buckets[key]
+        return self
+
+    def __len__(self):
+        return len(self._items)
+
+
+def near_duplicate_report(articles, index):
+    """
+    Verifica cada notícia candidata contra o índice e contra as candidatas anteriores.
+
+    Returns:
+        list: Dicionários {'article', 'collided_with', 'similarity'} para as quase duplicatas.
+    """
+    batch = SimilarityIndex(index.threshold)
+    report = []
+    for article in articles:
+        match = index.query(article) or batch.query(article)
+        if match:
+            report.append({'article': article, 'collided_with': match[0], 'similarity': match[1]})
+            logging.info("Quase duplicata (%.2f): '%s' colide com '%s' (%s)", match[1],
+                         article['title'], match[0]['titulo'], match[0]['link'])
+        else:
+            batch.add(article)
+    return report
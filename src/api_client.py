@@ -1,137 +1,321 @@
 import os
 import datetime
-import random
+import threading
 import time
-import requests
-import tweepy
-from tweepy.errors import TooManyRequests, TweepyException
-from supabase import create_client, Client
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+from src.cache_respostas import ResponseCache
+from src.controle_taxa import camara_rate, parse_retry_after
+from src.estado import RunState
+from src.metricas import metrics
+from src.token_x import REFRESH_MARGIN, TOKENS_KEY, XTokenManager
+
+CAMARA_API_URL = "https://dadosabertos.camara.leg.br/api/v2"
+
+# O deputado tem até 90 dias para apresentar um recibo: o mês corrente e os três
+# anteriores ainda podem receber despesas novas; os demais são considerados fechados.
+CAMARA_OPEN_MONTHS = int(os.environ.get("CAMARA_OPEN_MONTHS", "4"))
+
+# Cache opcional em disco das respostas da Câmara (desligado se CAMARA_CACHE_DIR não for definido)
+CAMARA_CACHE_DIR = os.environ.get("CAMARA_CACHE_DIR")
+CAMARA_CACHE_MAX_MB = int(os.environ.get("CAMARA_CACHE_MAX_MB", "200"))
+# Validade por endpoint, em segundos (None = nunca expira)
+TTL_DEPUTIES = 6 * 3600
+TTL_CURRENT_MONTH = 10 * 60
+TTL_OPEN_MONTH = 3 * 3600
+TTL_CLOSED_MONTH = None
+# Tentativas por requisição à Câmara quando a resposta é 429/5xx ou a conexão falha
+CAMARA_MAX_ATTEMPTS = int(os.environ.get("CAMARA_MAX_ATTEMPTS", "6"))
+# Threads de pré-busca de páginas, compartilhadas por todas as iterações do cliente
+PREFETCH_WORKERS = 8
+
+# Cabeçalhos de cota do X: janela de 15 min do endpoint e limites diários do app/usuário
+RATE_LIMIT_HEADERS = ("x-rate-limit", "x-app-limit-24hour", "x-user-limit-24hour")
+# Bloqueio usado quando um 429 chega sem cabeçalho de reset (s)
+RATE_LIMIT_FALLBACK = 2 * 3600
+
+def rate_limit_reset(headers):
+    """Epoch em que a cota esgotada mais restritiva é renovada, ou None se ainda há cota."""
+    resets = []
+    for prefix in RATE_LIMIT_HEADERS:
+        remaining, reset = headers.get(f"{prefix}-remaining"), headers.get(f"{prefix}-reset")
+        if remaining is not None:
+            metrics.gauge("x_rate_limit_remaining", int(remaining), limite=prefix)
+        if remaining == "0" and reset:
+            resets.append(float(reset))
+    return max(resets) if resets else None
+
+def _fmt_epoch(epoch):
+    return datetime.datetime.fromtimestamp(epoch).strftime("%H:%M:%S")
+
+def _next_link(data, rel="next"):
+    """Retorna o href da relação `rel` de uma página da API da Câmara, se houver."""
+    return next((link["href"] for link in data.get("links", []) if link["rel"] == rel), None)
+
+def is_closed_month(year, month, today=None, open_months=CAMARA_OPEN_MONTHS):
+    """Indica se o mês já saiu da janela em que a Câmara ainda aceita novas despesas."""
+    today = today or datetime.date.today()
+    return (today.year * 12 + today.month) - (year * 12 + month) >= open_months
+
+def expenses_ttl(year, month, today=None):
+    """Validade no cache das despesas de um mês: minutos no mês corrente, para sempre se fechado."""
+    today = today or datetime.date.today()
+    if (year, month) == (today.year, today.month): return TTL_CURRENT_MONTH
+    return TTL_CLOSED_MONTH if is_closed_month(year, month, today) else TTL_OPEN_MONTH
 
 class SentinelAPIClient:
-    def __init__(self):
+    def __init__(self, cache_dir=CAMARA_CACHE_DIR):
         self.headers = {
             "Accept": "application/json",
             "User-Agent": "SentinelPrimeGov/1.0 (Bot; OpenSource; Transparencia Publica)"
         }
-        
-        # Setup Supabase
-        sb_url = os.environ.get("SUPABASE_URL")
-        sb_key = os.environ.get("SUPABASE_SERVICE_KEY")
-        self.db: Client = create_client(sb_url, sb_key) if sb_url and sb_key else None
-        
+        self.cache = ResponseCache(cache_dir, CAMARA_CACHE_MAX_MB * 1024 * 1024) if cache_dir else None
+        self.rate = camara_rate
+
+        # Supabase, estado e cliente X são criados no primeiro uso (ver propriedades abaixo):
+        # a maioria dos ciclos horários termina sem postar e não precisa do X
+        self._db = self._state = self._x_client = self._publishers = self._prefetch_pool = None
+        self._db_ready = self._x_ready = False
+        self._x_expires_at = None
+        # Os workers dos outboxes também usam estas propriedades; a criação é serializada
+        self._init_lock = threading.RLock()
+
         # Credenciais OAuth 2.0
         self.client_id = os.environ.get("X_OAUTH2_CLIENT_ID")
         self.client_secret = os.environ.get("X_OAUTH2_CLIENT_SECRET")
         self.redirect_uri = "https://github.com/zlimaz/Sentinel_Prime_GoV"
 
-        # Inicializa cliente (será populado pelo refresh_token)
-        self.x_client = self._init_x_client_v2()
+    @property
+    def db(self):
+        if self._db_ready: return self._db
+        with self._init_lock:
+            # Outra thread pode ter criado o cliente enquanto esta esperava o lock
+            if not self._db_ready:
+                sb_url = os.environ.get("SUPABASE_URL")
+                sb_key = os.environ.get("SUPABASE_SERVICE_KEY")
+                if sb_url and sb_key:
+                    from supabase import create_client
+                    with metrics.span("startup.supabase"):
+                        self._db = create_client(sb_url, sb_key)
+                # A flag só é ligada depois de _db atribuído: quem a vê já lê o cliente pronto
+                self._db_ready = True
+        return self._db
+
+    @property
+    def state(self):
+        # Estado do bot carregado em uma única consulta para toda a execução
+        with self._init_lock:
+            if self._state is None and self.db:
+                self._state = RunState(self.db)
+        return self._state
+
+    @property
+    def x_client(self):
+        # Inicializa cliente (será populado pelo refresh_token) só quando for postar
+        with self._init_lock:
+            # No modo serviço o access token vence durante o processo: recria o cliente antes disso
+            if self._x_ready and self._x_expires_at and time.time() > self._x_expires_at - REFRESH_MARGIN:
+                self._x_ready = False
+            if not self._x_ready:
+                self._x_ready = True
+                with metrics.span("startup.x_client"):
+                    self._x_client = self._init_x_client_v2()
+        return self._x_client
 
     def _init_x_client_v2(self):
-        """Inicializa o cliente X usando OAuth 2.0 com Refresh Token do Supabase."""
+        """Inicializa o cliente X usando OAuth 2.0, renovando o token só quando perto de expirar."""
+        import tweepy
         try:
-            # 1. Busca tokens atuais no Supabase
-            res = self.db.table("bot_state").select("value").eq("key", "twitter_tokens").execute()
-            if not res.data:
-                print("Erro: Tokens OAuth 2.0 não encontrados no Supabase.")
+            manager = XTokenManager(self.db, self.state, self.client_id, self.client_secret,
+                                    self.redirect_uri)
+            access_token = manager.access_token()
+            if not access_token:
                 return None
-            
-            tokens = res.data[0]["value"]
-            
-            # 2. Configura o Handler de OAuth 2.0
-            oauth2_handler = tweepy.OAuth2UserHandler(
-                client_id=self.client_id,
-                redirect_uri=self.redirect_uri,
-                scope=["tweet.read", "tweet.write", "users.read", "offline.access"],
-                client_secret=self.client_secret
-            )
-
-            # 3. Faz o Refresh do Token (Garante que temos um access_token válido)
-            # O Tweepy renova automaticamente se passarmos o refresh_token
-            new_tokens = oauth2_handler.refresh_token(
-                "https://api.twitter.com/2/oauth2/token",
-                refresh_token=tokens["refresh_token"]
-            )
-
-            # 4. Salva os novos tokens no Supabase para a próxima execução
-            self.db.table("bot_state").upsert({
-                "key": "twitter_tokens", 
-                "value": new_tokens
-            }).execute()
-
-            # 5. Retorna o cliente autenticado
-            return tweepy.Client(bearer_token=new_tokens["access_token"])
+            self._x_expires_at = (self.state.get(TOKENS_KEY) or {}).get("expires_at")
+            # Resposta HTTP crua: os cabeçalhos de rate limit definem o próximo envio
+            import requests
+            return tweepy.Client(bearer_token=access_token, return_type=requests.Response)
 
         except Exception as e:
             print(f"Erro ao renovar tokens OAuth 2.0: {e}")
             return None
 
-    def is_under_rate_limit_lock(self):
+    @property
+    def publishers(self):
+        # Um outbox por rede ativa (PUBLISHERS), cada um com o próprio worker
+        with self._init_lock:
+            if self._publishers is None and self.state:
+                from src.publicadores.base import create_hub
+                self._publishers = create_hub(self)
+        return self._publishers
+
+    def rate_limit_until(self):
+        """Epoch até o qual o envio ao X está bloqueado, ou None."""
         try:
-            res = self.db.table("bot_state").select("value").eq("key", "rate_limit_lock").execute()
-            if res.data:
-                lock_time = datetime.datetime.fromisoformat(res.data[0]["value"])
-                if datetime.datetime.now(datetime.timezone.utc) < lock_time:
-                    return True
+            lock_value = self.state.get("rate_limit_lock")
+            if lock_value:
+                lock_time = datetime.datetime.fromisoformat(lock_value).timestamp()
+                if time.time() < lock_time:
+                    return lock_time
         except Exception: pass
-        return False
+        return None
 
-    def set_rate_limit_lock(self, hours=2):
-        lock_until = (datetime.datetime.now(datetime.timezone.utc) + 
-                     datetime.timedelta(hours=hours)).isoformat()
+    def is_under_rate_limit_lock(self):
+        return self.rate_limit_until() is not None
+
+    def set_rate_limit_lock(self, hours=2, until=None):
+        # `until` (epoch) vem do reset informado pelo X; `hours` fica como alternativa fixa
+        if until is None: until = time.time() + hours * 3600
+        lock_until = datetime.datetime.fromtimestamp(until, datetime.timezone.utc).isoformat()
         try:
-            self.db.table("bot_state").upsert({"key": "rate_limit_lock", "value": lock_until}).execute()
+            self.state.set("rate_limit_lock", lock_until)
         except Exception: pass
 
+    def _get_json(self, url, params=None, ttl=0):
+        """GET na API da Câmara passando pelo cache em disco, se habilitado (ttl=0 não guarda).
+
+        Cada requisição passa pelo controlador de taxa compartilhado; 429, 5xx e falhas de
+        conexão reduzem a taxa e são repetidas até CAMARA_MAX_ATTEMPTS vezes.
+        """
+        if self.cache:
+            cached = self.cache.get(url, params)
+            if cached is not None: return cached
+        import requests
+        for attempt in range(CAMARA_MAX_ATTEMPTS):
+            last = attempt == CAMARA_MAX_ATTEMPTS - 1
+            self.rate.acquire()
+            start = time.perf_counter()
+            try:
+                response = requests.get(url, headers=self.headers, params=params, timeout=30)
+            except (requests.ConnectionError, requests.Timeout):
+                metrics.observe_http(url, "erro", time.perf_counter() - start)
+                if last: raise
+                self.rate.on_throttle(attempt)
+                metrics.inc("camara_retries_total", motivo="conexao")
+                continue
+            metrics.observe_http(url, response.status_code, time.perf_counter() - start)
+            if response.status_code == 429 or response.status_code >= 500:
+                if last: response.raise_for_status()
+                pause = self.rate.on_throttle(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                metrics.inc("camara_retries_total", motivo=str(response.status_code))
+                print(f"Câmara respondeu {response.status_code}; taxa reduzida para "
+                      f"{self.rate.rate:.2f} req/s, nova tentativa em {pause:.1f}s.")
+                continue
+            break
+        response.raise_for_status()
+        self.rate.on_success()
+        data = response.json()
+        if self.cache and ttl != 0: self.cache.put(url, params, data, ttl)
+        return data
+
     def get_deputies_list(self):
         all_deputies = []
-        url = "https://dadosabertos.camara.leg.br/api/v2/deputados?ordem=ASC&ordenarPor=nome&itens=100"
+        url = f"{CAMARA_API_URL}/deputados?ordem=ASC&ordenarPor=nome&itens=100"
         while url:
             try:
-                response = requests.get(url, headers=self.headers, timeout=30)
-                response.raise_for_status()
-                data = response.json()
+                data = self._get_json(url, ttl=TTL_DEPUTIES)
                 all_deputies.extend(data["dados"])
-                url = next((link["href"] for link in data["links"] if link["rel"] == "next"), None)
+                url = _next_link(data)
             except Exception: break
         return all_deputies
 
-    def get_deputy_expenses(self, deputy_id, year=None, month=None):
-        url = f"https://dadosabertos.camara.leg.br/api/v2/deputados/{deputy_id}/despesas"
+    def _get_expenses_page(self, url, params=None, raise_errors=False, ttl=0):
+        """Busca uma página de despesas. Retorna None em caso de erro, ou propaga com raise_errors."""
+        try:
+            return self._get_json(url, params, ttl)
+        except Exception as e:
+            if raise_errors: raise
+            print(f"Erro ao buscar despesas ({url}): {e}")
+            return None
+
+    def iter_deputy_expenses(self, deputy_id, year=None, month=None, prefetch=False, raise_errors=False):
+        """Percorre todas as páginas de despesas do mês, entregando os registros conforme chegam.
+
+        Com prefetch=True a próxima página é baixada em segundo plano enquanto a atual
+        é consumida, mantendo no máximo duas páginas em memória. Com raise_errors=True
+        uma falha de rede interrompe a iteração com exceção em vez de encerrá-la em silêncio.
+        """
+        url = f"{CAMARA_API_URL}/deputados/{deputy_id}/despesas"
         params = {"ano": year or datetime.datetime.now().year, "mes": month or datetime.datetime.now().month, "itens": 100}
+        ttl = expenses_ttl(params["ano"], params["mes"])
+        pool = self._prefetch_executor() if prefetch else None
+        future = None
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
-            return response.json().get("dados", []) if response.status_code == 200 else []
-        except Exception: return []
+            page = self._get_expenses_page(url, params, raise_errors, ttl)
+            while page:
+                # O link "next" já carrega todos os parâmetros da consulta
+                next_url = _next_link(page)
+                future = pool.submit(self._get_expenses_page, next_url, None, raise_errors, ttl) if pool and next_url else None
+                metrics.inc("rows_fetched_total", len(page.get("dados", [])), fonte="camara")
+                yield from page.get("dados", [])
+                if future: page, future = future.result(), None
+                else: page = self._get_expenses_page(next_url, None, raise_errors, ttl) if next_url else None
+        finally:
+            # Iteração abandonada: a página já pedida é descartada se ainda não começou
+            if future: future.cancel()
+
+    def _prefetch_executor(self):
+        """Pool único de pré-busca, criado no primeiro uso (um por deputado/mês custaria uma thread cada)."""
+        with self._init_lock:
+            if self._prefetch_pool is None:
+                self._prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS,
+                                                         thread_name_prefix="prefetch")
+            return self._prefetch_pool
+
+    def peek_deputy_expenses(self, deputy_id, year, month):
+        """Conta as despesas do mês e traz a mais recente, com uma consulta de 1 item por página.
 
-    def post_tweet_thread(self, tweets):
+        Retorna (total, despesa mais recente ou None), ou None em caso de erro.
+        """
+        url = f"{CAMARA_API_URL}/deputados/{deputy_id}/despesas"
+        params = {"ano": year, "mes": month, "itens": 1, "ordenarPor": "dataDocumento", "ordem": "DESC"}
+        page = self._get_expenses_page(url, params, ttl=expenses_ttl(year, month))
+        if page is None: return None
+        if not page.get("dados"): return 0, None
+        # Com 1 item por página, o número da última página é o total de registros
+        last = _next_link(page, "last")
+        pagina = parse_qs(urlparse(last).query).get("pagina") if last else None
+        return (int(pagina[0]) if pagina else len(page["dados"])), page["dados"][0]
+
+    def get_deputy_expenses(self, deputy_id, year=None, month=None):
+        return list(self.iter_deputy_expenses(deputy_id, year, month))
+
+    def send_tweet(self, text, reply_to=None):
+        """Posta um tweet. Retorna (status, id, liberado_em), status em ok/rate_limit/duplicate/erro."""
         if not self.x_client:
             print("Erro: X Client não inicializado. Verifique os tokens OAuth 2.0 no Supabase.")
-            return None
-            
-        if self.is_under_rate_limit_lock():
-            print("Execução abortada: Bot em quarentena de Rate Limit.")
-            return None
+            return "sem_cliente", None, None
 
-        last_id = None
-        for i, text in enumerate(tweets):
-            try:
-                if i > 0:
-                    time.sleep(random.uniform(10, 30))
-
-                # Para OAuth 2.0, o Tweepy usa bearer_token internamente no Client
-                response = self.x_client.create_tweet(text=text, in_reply_to_tweet_id=last_id)
-                last_id = response.data['id']
-                print(f"Postado com sucesso (OAuth 2.0)! ID: {last_id}")
-            
-            except TooManyRequests:
-                print("Erro: Rate Limit atingido no X.")
-                self.set_rate_limit_lock(2)
-                return "rate_limit"
-            except TweepyException as e:
-                if "duplicate content" in str(e).lower():
-                    print("Erro: Conteúdo duplicado no X.")
-                    return "duplicate"
-                print(f"Erro ao postar no X (OAuth 2.0): {e}")
-                return None
-        return last_id
+        from tweepy.errors import TooManyRequests, TweepyException
+        try:
+            with metrics.span("x.create_tweet"):
+                response = self.x_client.create_tweet(text=text, in_reply_to_tweet_id=reply_to)
+        except TooManyRequests as e:
+            metrics.inc("x_errors_total", tipo="rate_limit")
+            free_at = rate_limit_reset(e.response.headers) or time.time() + RATE_LIMIT_FALLBACK
+            self.set_rate_limit_lock(until=free_at)
+            print(f"Erro: Rate Limit atingido no X. Envio retomado às {_fmt_epoch(free_at)}.")
+            return "rate_limit", None, free_at
+        except TweepyException as e:
+            duplicate = "duplicate content" in str(e).lower()
+            metrics.inc("x_errors_total", tipo="duplicate" if duplicate else "outro")
+            if duplicate:
+                print("Erro: Conteúdo duplicado no X.")
+                return "duplicate", None, None
+            print(f"Erro ao postar no X (OAuth 2.0): {e}")
+            return "erro", None, None
+
+        metrics.inc("tweets_posted_total")
+        tweet_id = response.json()["data"]["id"]
+        print(f"Postado com sucesso (OAuth 2.0)! ID: {tweet_id}")
+        # Cota esgotada (janela de 15 min ou diária): o próximo envio espera o reset informado
+        return "ok", tweet_id, rate_limit_reset(response.headers)
+
+    def publish_thread(self, thread, origem=None):
+        """
+        Enfileira a thread no outbox de cada rede ativa e dispara o envio em segundo plano.
+
+        Retorna {rede: id do item no outbox}, ou None se nenhuma rede aceitou a thread
+        (quarentena de rate limit, cliente indisponível ou outbox cheio).
+        """
+        return self.publishers.publish(thread, origem)
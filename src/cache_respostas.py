@@ -0,0 +1,84 @@
+"""Cache persistente em disco para respostas da API de Dados Abertos da Câmara."""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Guarda respostas JSON comprimidas (gzip), uma por arquivo, chaveadas por URL e parâmetros.
+
+    Cada entrada tem seu próprio prazo de validade (ttl em segundos; None = nunca expira).
+    O tamanho total é limitado a max_bytes, removendo as entradas menos usadas (LRU pelo
+    mtime do arquivo, atualizado a cada acerto).
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total = sum(entry.stat().st_size for entry in os.scandir(directory)
+                          if entry.name.endswith(".json.gz"))
+
+    def _path(self, url, params):
+        raw = json.dumps([url, sorted((params or {}).items())], default=str)
+        return os.path.join(self.directory, hashlib.sha256(raw.encode()).hexdigest() + ".json.gz")
+
+    def get(self, url, params=None):
+        """Retorna os dados em cache ou None se ausentes/expirados."""
+        path = self._path(url, params)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expira"] is not None and entry["expira"] < time.time():
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError: pass
+        return entry["dados"]
+
+    def put(self, url, params, data, ttl=None):
+        path = self._path(url, params)
+        payload = json.dumps({"expira": time.time() + ttl if ttl is not None else None,
+                              "dados": data}, ensure_ascii=False)
+        blob = gzip.compress(payload.encode("utf-8"))
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                old_size = os.path.getsize(path) if os.path.exists(path) else 0
+                with open(tmp_path, "wb") as f:
+                    f.write(blob)
+                os.replace(tmp_path, path)
+                self._total += len(blob) - old_size
+            except OSError:
+                return
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path):
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._total -= size
+            except OSError: pass
+
+    def _evict(self):
+        """Remove as entradas menos usadas até voltar a 90% do limite. Chamado com o lock."""
+        entries = sorted((e for e in os.scandir(self.directory) if e.name.endswith(".json.gz")),
+                         key=lambda e: e.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._total <= target: break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total -= size
+            except OSError: pass
@@ -0,0 +1,69 @@
+"""Agenda adaptativa de consulta aos feeds: cada fonte é consultada conforme o seu ritmo de publicação."""
+import os
+import random
+import time
+
+# Limites do intervalo entre consultas de uma fonte (s)
+FEED_MIN_POLL = float(os.environ.get("FEED_MIN_POLL", "120"))
+FEED_MAX_POLL = float(os.environ.get("FEED_MAX_POLL", "3600"))
+FEED_DEFAULT_POLL = 900
+# Espera máxima após falhas seguidas (s)
+FEED_MAX_BACKOFF = 6 * 3600
+# Fração do intervalo médio entre publicações usada como intervalo de consulta
+POLL_FRACTION = 0.5
+# Publicações mais recentes consideradas no cálculo do ritmo
+RATE_SAMPLE = 10
+
+
+class SourceSchedule:
+    """
+    Intervalo de consulta por fonte, aprendido das datas de publicação das entradas.
+
+    A cada coleta bem-sucedida, o intervalo médio entre as últimas RATE_SAMPLE
+    publicações define o novo intervalo (POLL_FRACTION dele, suavizado com o anterior
+    e limitado a [FEED_MIN_POLL, FEED_MAX_POLL]). Falhas dobram a espera até
+    FEED_MAX_BACKOFF. O estado é serializável para sobreviver a reinícios.
+    """
+
+    def __init__(self, names, saved=None):
+        saved = saved or {}
+        self.sources = {}
+        for name in names:
+            entry = dict(saved.get(name) or {})
+            entry.setdefault("intervalo", FEED_DEFAULT_POLL)
+            entry.setdefault("erros", 0)
+            entry["proximo"] = min(entry.get("proximo", 0), time.time() + entry["intervalo"])
+            self.sources[name] = entry
+
+    def due(self, now=None):
+        """Nomes das fontes cuja próxima consulta já venceu."""
+        now = now or time.time()
+        return [name for name, s in self.sources.items() if s["proximo"] <= now]
+
+    def seconds_to_next(self, now=None):
+        now = now or time.time()
+        return max(0.0, min(s["proximo"] for s in self.sources.values()) - now)
+
+    def record(self, name, status, published=(), now=None):
+        """Atualiza a fonte após uma coleta (status do relatório de collect_news)."""
+        now = now or time.time()
+        s = self.sources[name]
+        if status in ("erro", "timeout"):
+            s["erros"] += 1
+            wait = min(s["intervalo"] * 2 ** s["erros"], FEED_MAX_BACKOFF)
+        else:
+            s["erros"] = 0
+            stamps = sorted(t for t in published if t and t <= now + 300)[-RATE_SAMPLE:]
+            if len(stamps) >= 3:
+                gap = (stamps[-1] - stamps[0]) / (len(stamps) - 1)
+                s["ritmo_s"] = round(gap)
+                target = min(max(gap * POLL_FRACTION, FEED_MIN_POLL), FEED_MAX_POLL)
+                s["intervalo"] = round((s["intervalo"] + target) / 2)
+            wait = s["intervalo"]
+        # Jitter de ±10% para as fontes não se alinharem
+        s["proximo"] = now + wait * random.uniform(0.9, 1.1)
+        s["ultima"] = now
+        s["status"] = status
+
+    def to_state(self):
+        return {name: dict(s) for name, s in self.sources.items()}
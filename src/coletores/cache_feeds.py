@@ -0,0 +1,112 @@
+"""Cache persistente de validadores HTTP (ETag / Last-Modified) dos feeds RSS."""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from src.coletores.parser_rss import parse_news_feed
+from src.metricas import metrics
+
+
+FEED_CACHE_FILE = os.environ.get("FEED_CACHE_FILE", os.path.join(".cache", "feeds.json"))
+
+_lock = threading.Lock()
+_cache = None
+_session = None
+
+
+def get_session():
+    """Sessão HTTP compartilhada: no modo serviço mantém as conexões com os feeds abertas."""
+    global _session  # pylint: disable=global-statement
+    with _lock:
+        if _session is None:
+            import requests
+            _session = requests.Session()
+        return _session
+
+
+def _load_cache():
+    """Carrega o cache do disco na primeira chamada. Deve ser chamado com o lock."""
+    global _cache  # pylint: disable=global-statement
+    if _cache is None:
+        try:
+            with open(FEED_CACHE_FILE, encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _save_cache(cache):
+    """Grava o cache de forma atômica. Deve ser chamado com o lock."""
+    try:
+        os.makedirs(os.path.dirname(FEED_CACHE_FILE) or ".", exist_ok=True)
+        tmp_path = FEED_CACHE_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, FEED_CACHE_FILE)
+    except OSError as e:
+        logging.error("Falha ao salvar o cache de feeds: %s", e)
+
+
+def conditional_get(url, headers, timeout=15, verify=False):
+    """
+    Faz um GET condicional com os validadores salvos para a URL.
+
+    Retorna:
+        tuple: (response, cached_news). Se o servidor responder 304, ou devolver
+               exatamente o mesmo conteúdo da última vez, cached_news é a lista de
+               notícias já analisada; caso contrário é None e o feed deve ser analisado.
+    """
+    import requests
+    with _lock:
+        entry = _load_cache().get(url) or {}
+
+    request_headers = dict(headers)
+    if "news" in entry:
+        if entry.get("etag"):
+            request_headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            request_headers["If-Modified-Since"] = entry["last_modified"]
+
+    start = time.perf_counter()
+    try:
+        response = get_session().get(url, headers=request_headers, timeout=timeout, verify=verify)
+    except requests.RequestException:
+        metrics.observe_http(url, "erro", time.perf_counter() - start)
+        raise
+    metrics.observe_http(url, response.status_code, time.perf_counter() - start)
+    if "news" not in entry:
+        return response, None
+    if response.status_code == 304:
+        return response, entry["news"]
+    # Servidores sem validadores: compara o conteúdo byte a byte pelo hash
+    if response.status_code == 200 and entry.get("sha1") == hashlib.sha1(response.content).hexdigest():
+        return response, entry["news"]
+    return response, None
+
+
+def parse_news(url, response):
+    """
+    Analisa o feed da resposta partindo da leitura anterior guardada para a URL.
+
+    Retorna:
+        tuple: (news_list, error). Em feed malformado, news_list é None e error traz a causa.
+    """
+    with _lock:
+        previous = (_load_cache().get(url) or {}).get("news")
+    return parse_news_feed(response.content, previous)
+
+
+def store_feed(url, response, news_list):
+    """Salva os validadores da resposta junto com as notícias já analisadas."""
+    with _lock:
+        cache = _load_cache()
+        cache[url] = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "sha1": hashlib.sha1(response.content).hexdigest(),
+            "news": news_list
+        }
+        _save_cache(cache)
@@ -2,8 +2,7 @@
 """
 Coletor de notícias da Agência Brasil."""
 import logging
-import feedparser
-import requests
+from src.coletores.cache_feeds import conditional_get, parse_news, store_feed
 
 
 # Configuração básica de logging
@@ -25,39 +24,37 @@ def fetch_agenciabrasil_news():
     Retorna:
         list: Uma lista de dicionários, onde cada dicionário representa uma notícia
               com as chaves 'title', 'link' e 'summary'.
-              Retorna uma lista vazia em caso de erro.
+              Retorna None em caso de erro (feed inacessível ou malformado).
     """
+    # Importados no primeiro uso para não pesar na partida do processo
+    import requests
     logging.info(f"Buscando notícias do feed: {AGENCIABRASIL_NEWS_RSS_URL}")
     try:
-        response = requests.get(AGENCIABRASIL_NEWS_RSS_URL, headers=HEADERS,
-                                timeout=15, verify=False)
+        response, cached_news = conditional_get(AGENCIABRASIL_NEWS_RSS_URL, HEADERS,
+                                                timeout=15, verify=False)
+        if cached_news is not None:
+            logging.info("Feed da Agência Brasil inalterado; reutilizando %d notícias do cache.",
+                         len(cached_news))
+            return cached_news
         response.raise_for_status()
 
-        feed = feedparser.parse(response.content)
+        # Leitura incremental até a última notícia já vista; feedparser se o XML for malformado
+        news_list, error = parse_news(AGENCIABRASIL_NEWS_RSS_URL, response)
 
-        if feed.bozo:
-            logging.error("O feed RSS da Agência Brasil está malformado. Causa: %s",
-                          feed.bozo_exception)
-            return []
-
-        news_list = []
-        for entry in feed.entries:
-            news_item = {
-                'title': entry.title,
-                'link': entry.link,
-                'summary': getattr(entry, 'summary', '')
-            }
-            news_list.append(news_item)
+        if news_list is None:
+            logging.error("O feed RSS da Agência Brasil está malformado. Causa: %s", error)
+            return None
 
+        store_feed(AGENCIABRASIL_NEWS_RSS_URL, response, news_list)
         logging.info("%d notícias encontradas no feed da Agência Brasil.", len(news_list))
         return news_list
 
     except requests.RequestException as e:
         logging.error("Falha ao fazer a requisição para o feed da Agência Brasil: %s", e)
-        return []
+        return None
     except Exception as e:  # pylint: disable=broad-except
         logging.error("Falha ao analisar o feed de notícias da Agência Brasil: %s", e)
-        return []
+        return None
 
 
 if __name__ == '__main__':
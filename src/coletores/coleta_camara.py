@@ -1,6 +1,6 @@
 """Coletor de notícias da Câmara dos Deputados."""
 import logging
-import feedparser
+from src.coletores.cache_feeds import conditional_get, parse_news, store_feed
 
 
 # Configuração básica de logging
@@ -8,6 +8,12 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 CAMARA_NEWS_RSS_URL = "https://www.camara.leg.br/noticias/rss/ultimas-noticias"
 
+# Cabeçalho para simular um navegador
+HEADERS = {
+    'User-Agent': ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+}
+
 
 def fetch_camara_news():
     """
@@ -16,32 +22,33 @@ def fetch_camara_news():
     Retorna:
         list: Uma lista de dicionários, onde cada dicionário representa uma notícia
               com as chaves 'title', 'link' e 'summary'.
-              Retorna uma lista vazia em caso de erro.
+              Retorna None em caso de erro (feed inacessível ou malformado).
     """
     logging.info(f"Buscando notícias do feed: {CAMARA_NEWS_RSS_URL}")
     try:
-        feed = feedparser.parse(CAMARA_NEWS_RSS_URL)
-
-        if feed.bozo:
-            logging.error("O feed RSS da Câmara está malformado. Causa: %s",
-                          feed.bozo_exception)
-            return []
-
-        news_list = []
-        for entry in feed.entries:
-            news_item = {
-                'title': entry.title,
-                'link': entry.link,
-                'summary': entry.summary
-            }
-            news_list.append(news_item)
+        # GET condicional: feed inalterado devolve as notícias já analisadas
+        response, cached_news = conditional_get(CAMARA_NEWS_RSS_URL, HEADERS,
+                                                timeout=15, verify=True)
+        if cached_news is not None:
+            logging.info("Feed da Câmara inalterado; reutilizando %d notícias do cache.",
+                         len(cached_news))
+            return cached_news
+        response.raise_for_status()
+
+        # Leitura incremental até a última notícia já vista; feedparser se o XML for malformado
+        news_list, error = parse_news(CAMARA_NEWS_RSS_URL, response)
+
+        if news_list is None:
+            logging.error("O feed RSS da Câmara está malformado. Causa: %s", error)
+            return None
 
+        store_feed(CAMARA_NEWS_RSS_URL, response, news_list)
         logging.info("%d notícias encontradas no feed da Câmara.", len(news_list))
         return news_list
 
     except Exception as e:  # pylint: disable=broad-except
         logging.error("Falha ao buscar ou analisar o feed de notícias da Câmara: %s", e)
-        return []
+        return None
 
 
 if __name__ == '__main__':
@@ -1,7 +1,6 @@
 "Coletor de notícias do Senado Federal."
 import logging
-import feedparser
-import requests
+from src.coletores.cache_feeds import conditional_get, parse_news, store_feed
 
 
 # Configuração básica de logging
@@ -23,42 +22,38 @@ def fetch_senado_news():
     Retorna:
         list: Uma lista de dicionários, onde cada dicionário representa uma notícia
               com as chaves 'title', 'link' e 'summary'.
-              Retorna uma lista vazia em caso de erro.
+              Retorna None em caso de erro (feed inacessível ou malformado).
     """
+    # Importados no primeiro uso para não pesar na partida do processo
+    import requests
     logging.info(f"Buscando notícias do feed: {SENADO_NEWS_RSS_URL}")
     try:
-        # Usando requests para buscar o conteúdo com headers
-        response = requests.get(SENADO_NEWS_RSS_URL, headers=HEADERS,
-                                timeout=15, verify=False)
+        # GET condicional: feed inalterado devolve as notícias já analisadas
+        response, cached_news = conditional_get(SENADO_NEWS_RSS_URL, HEADERS,
+                                                timeout=15, verify=False)
+        if cached_news is not None:
+            logging.info("Feed do Senado inalterado; reutilizando %d notícias do cache.",
+                         len(cached_news))
+            return cached_news
         response.raise_for_status()  # Lança exceção para status de erro (4xx ou 5xx)
 
-        # Passando o conteúdo para o feedparser
-        feed = feedparser.parse(response.content)
+        # Leitura incremental até a última notícia já vista; feedparser se o XML for malformado
+        news_list, error = parse_news(SENADO_NEWS_RSS_URL, response)
 
-        if feed.bozo:
-            # feed.bozo é 1 se o feed estiver malformado
-            logging.error("O feed RSS está malformado. Causa: %s",
-                          feed.bozo_exception)
-            return []
-
-        news_list = []
-        for entry in feed.entries:
-            news_item = {
-                'title': entry.title,
-                'link': entry.link,
-                'summary': getattr(entry, 'summary', '')
-            }
-            news_list.append(news_item)
+        if news_list is None:
+            logging.error("O feed RSS está malformado. Causa: %s", error)
+            return None
 
+        store_feed(SENADO_NEWS_RSS_URL, response, news_list)
         logging.info("%d notícias encontradas no feed do Senado.", len(news_list))
         return news_list
 
     except requests.RequestException as e:
         logging.error("Falha ao fazer a requisição para o feed do Senado: %s", e)
-        return []
+        return None
     except Exception as e:  # pylint: disable=broad-except
         logging.error("Falha ao analisar o feed de notícias do Senado: %s", e)
-        return []
+        return None
 
 
 if __name__ == '__main__':
@@ -0,0 +1,193 @@
+"""Enriquecimento das notícias candidatas com o resumo da própria página (og:description ou lide)."""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from src.metricas import metrics
+
+# Quantas notícias candidatas são enriquecidas por ciclo
+ENRICH_CANDIDATES = int(os.environ.get("ENRICH_CANDIDATES", "5"))
+# Máximo lido de cada página (KB); a leitura para antes se o resumo já foi encontrado
+ENRICH_MAX_KB = int(os.environ.get("ENRICH_MAX_KB", "64"))
+ENRICH_PER_HOST = int(os.environ.get("ENRICH_PER_HOST", "2"))
+ENRICH_WORKERS = 6
+ENRICH_TIMEOUT = 8
+ENRICH_CACHE_FILE = os.environ.get("ENRICH_CACHE_FILE", os.path.join(".cache", "artigos.json"))
+ENRICH_CACHE_DAYS = 7
+ENRICH_CACHE_MAX = 2000
+# Parágrafos menores que isto não servem de lide (créditos, datas, legendas)
+MIN_LEAD_CHARS = 80
+CHUNK_SIZE = 8 * 1024
+
+HEADERS = {
+    'User-Agent': ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'),
+    'Accept': 'text/html,application/xhtml+xml'
+}
+
+_lock = threading.Lock()
+_cache = None
+_host_slots = {}
+
+
+def _load_cache():
+    """Carrega o cache do disco na primeira chamada. Deve ser chamado com o lock."""
+    global _cache  # pylint: disable=global-statement
+    if _cache is None:
+        try:
+            with open(ENRICH_CACHE_FILE, encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _save_cache(cache):
+    """Descarta entradas vencidas e grava o cache de forma atômica. Deve ser chamado com o lock."""
+    cutoff = time.time() - ENRICH_CACHE_DAYS * 86400
+    for url in [u for u, e in cache.items() if e["em"] < cutoff]:
+        del cache[url]
+    if len(cache) > ENRICH_CACHE_MAX:
+        for url in sorted(cache, key=lambda u: cache[u]["em"])[:len(cache) - ENRICH_CACHE_MAX]:
+            del cache[url]
+    try:
+        os.makedirs(os.path.dirname(ENRICH_CACHE_FILE) or ".", exist_ok=True)
+        tmp_path = ENRICH_CACHE_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, ENRICH_CACHE_FILE)
+    except OSError as e:
+        logging.error("Falha ao salvar o cache de artigos: %s", e)
+
+
+def _host_slot(url):
+    host = urlsplit(url).netloc
+    with _lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.Semaphore(ENRICH_PER_HOST)
+        return _host_slots[host]
+
+
+def extract_summary(html, complete=False):
+    """
+    Procura o resumo em um trecho (possivelmente truncado) de HTML.
+
+    Retorna (texto, origem) com origem "og" ou "lide", ou (None, None). Com o documento
+    incompleto, o lide só é aceito se o parágrafo já foi fechado.
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    for attrs in ({"property": "og:description"}, {"name": "description"},
+                  {"name": "twitter:description"}):
+        meta = soup.find("meta", attrs=attrs)
+        if meta and meta.get("content", "").strip():
+            return " ".join(meta["content"].split()), "og"
+    scope = soup.find("article") or soup.find("main") or soup.body or soup
+    paragraphs = scope.find_all("p")
+    # O último parágrafo de um trecho truncado pode estar cortado
+    if not complete and paragraphs: paragraphs = paragraphs[:-1]
+    for p in paragraphs:
+        text = " ".join(p.get_text(" ", strip=True).split())
+        if len(text) >= MIN_LEAD_CHARS:
+            return text, "lide"
+    return None, None
+
+
+def _charset(content_type):
+    _, _, params = content_type.partition(";")
+    for param in params.split(";"):
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "charset" and value: return value.strip('"')
+    # Sem charset declarado, as páginas das fontes são UTF-8
+    return "utf-8"
+
+
+def fetch_summary(url, session=None):
+    """
+    Lê a página em blocos e retorna o resumo encontrado, "" se não houver, ou None em falha.
+
+    A análise é tentada ao fim do <head> e depois a cada parágrafo fechado; a leitura
+    para no primeiro resumo encontrado ou em ENRICH_MAX_KB.
+    """
+    import requests
+    session = session or requests
+    limit = ENRICH_MAX_KB * 1024
+    with _host_slot(url), metrics.span("enrich.fetch"):
+        start = time.perf_counter()
+        try:
+            response = session.get(url, headers=HEADERS, timeout=ENRICH_TIMEOUT, stream=True)
+        except requests.RequestException as e:
+            metrics.observe_http(url, "erro", time.perf_counter() - start)
+            logging.warning("Falha ao buscar o artigo %s: %s", url, e)
+            return None
+        try:
+            metrics.observe_http(url, response.status_code, time.perf_counter() - start)
+            content_type = response.headers.get("Content-Type", "text/html")
+            if response.status_code != 200:
+                return None
+            if "html" not in content_type:
+                return ""
+            encoding = _charset(content_type)
+            buf, checked_at, complete = b"", -1, True
+            for chunk in response.iter_content(CHUNK_SIZE):
+                buf += chunk
+                lower = buf.lower()
+                # Analisa quando o <head> fecha (og:description) e a cada novo </p> (lide)
+                ready = b"</head>" in lower and (checked_at < 0 or lower.rfind(b"</p>") >= checked_at)
+                if ready or len(buf) >= limit:
+                    checked_at = len(buf)
+                    text, origin = extract_summary(buf[:limit].decode(encoding, "replace"))
+                    if text:
+                        metrics.inc("enrich_total", resultado=origin)
+                        metrics.inc("enrich_bytes_total", len(buf))
+                        return text
+                if len(buf) >= limit:
+                    complete = False
+                    break
+            metrics.inc("enrich_bytes_total", len(buf))
+            text, origin = extract_summary(buf[:limit].decode(encoding, "replace"), complete=complete)
+            metrics.inc("enrich_total", resultado=origin or "vazio")
+            return text or ""
+        except requests.RequestException as e:
+            logging.warning("Falha ao ler o artigo %s: %s", url, e)
+            return None
+        finally:
+            response.close()
+
+
+def enrich_articles(articles, limit=ENRICH_CANDIDATES):
+    """
+    Preenche 'lead' nas primeiras `limit` notícias com o resumo da página.
+
+    As páginas são lidas em paralelo, com no máximo ENRICH_PER_HOST conexões por
+    host, e o resultado (inclusive a ausência de resumo) fica em cache por URL.
+    """
+    from src.coletores.cache_feeds import get_session
+    targets = [a for a in articles[:limit] if a.get("link") and not a.get("lead")]
+    with _lock:
+        cache = _load_cache()
+        pending = []
+        for article in targets:
+            entry = cache.get(article["link"])
+            if entry is not None:
+                article["lead"] = entry["texto"] or None
+                metrics.inc("enrich_total", resultado="cache")
+            else:
+                pending.append(article)
+    if not pending: return articles
+
+    session = get_session()
+    with ThreadPoolExecutor(max_workers=min(ENRICH_WORKERS, len(pending))) as pool:
+        leads = list(pool.map(lambda a: fetch_summary(a["link"], session), pending))
+    with _lock:
+        cache = _load_cache()
+        for article, lead in zip(pending, leads):
+            article["lead"] = lead or None
+            # Falhas de rede (None) não entram no cache: a página é tentada de novo no próximo ciclo
+            if lead is not None:
+                cache[article["link"]] = {"texto": lead, "em": time.time()}
+        _save_cache(cache)
+    return articles
@@ -0,0 +1,134 @@
+"""Leitura rápida de feeds RSS/Atom por parsing incremental, com o feedparser como alternativa."""
+import calendar
+import datetime
+import email.utils
+import xml.etree.ElementTree as ET
+from src.metricas import metrics
+
+CHUNK_SIZE = 4 * 1024
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+
+
+def entry_timestamp(entry):
+    """Data de publicação (epoch UTC) de uma entrada do feedparser, ou None se ausente."""
+    parsed = getattr(entry, 'published_parsed', None) or getattr(entry, 'updated_parsed', None)
+    return calendar.timegm(parsed) if parsed else None
+
+
+def _parse_date(text):
+    """Converte datas RFC 822 (RSS) ou ISO 8601 (Atom, dc:date) em epoch UTC."""
+    if not text: return None
+    text = text.strip()
+    try:
+        return int(email.utils.parsedate_to_datetime(text).timestamp())
+    except (TypeError, ValueError, IndexError):
+        pass
+    try:
+        parsed = datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+        if parsed.tzinfo is None: parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return int(parsed.timestamp())
+    except ValueError:
+        return None
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _item_to_news(elem):
+    """Extrai title/link/summary/published de um <item> RSS ou <entry> Atom."""
+    title = link = summary = guid = None
+    published = None
+    for child in elem:
+        name = _local(child.tag)
+        text = (child.text or "").strip()
+        if name == "title":
+            title = text
+        elif name == "link":
+            if child.tag.startswith(ATOM_NS) or "href" in child.attrib:
+                if child.get("rel", "alternate") == "alternate" and not link:
+                    link = child.get("href")
+            elif text:
+                link = text
+        elif name in ("description", "summary") or (name in ("encoded", "content") and summary is None):
+            summary = text
+        elif name == "guid" and child.get("isPermaLink", "true") != "false":
+            guid = text
+        elif name in ("pubDate", "published", "date", "updated") and published is None:
+            published = _parse_date(text)
+    return {'title': title or "", 'link': link or guid or "", 'summary': summary or "",
+            'published': published}
+
+
+def iter_feed(content):
+    """
+    Gera as entradas do feed à medida que o XML é lido, em blocos de CHUNK_SIZE.
+
+    Levanta ET.ParseError se o documento for malformado ou não for RSS/Atom.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root_checked = False
+    for offset in range(0, len(content) or 1, CHUNK_SIZE):
+        parser.feed(content[offset:offset + CHUNK_SIZE])
+        for event, elem in parser.read_events():
+            if not root_checked:
+                if _local(elem.tag) not in ("rss", "feed", "RDF"):
+                    raise ET.ParseError(f"raiz inesperada: {_local(elem.tag)}")
+                root_checked = True
+            if event == "end" and _local(elem.tag) in ("item", "entry"):
+                yield _item_to_news(elem)
+                elem.clear()
+    parser.close()
+    if not root_checked:
+        raise ET.ParseError("documento vazio")
+
+
+def _is_descending(news):
+    stamps = [n.get("published") for n in news if n.get("published")]
+    return len(stamps) >= 2 and all(a >= b for a, b in zip(stamps, stamps[1:]))
+
+
+def parse_news_feed(content, previous=None):
+    """
+    Analisa um feed e retorna (notícias, erro), com erro None em caso de sucesso.
+
+    `previous` é a lista da leitura anterior do mesmo feed. Se ela estava em ordem
+    decrescente de data, a leitura para na primeira entrada já vista (mesmo link ou
+    data anterior à mais recente conhecida) e completa o resultado com a lista
+    anterior. Feeds que o parser incremental não aceita vão para o feedparser.
+    """
+    marker = previous[0] if previous and _is_descending(previous) else None
+    marker_link = marker.get('link') if marker else None
+    marker_date = marker.get('published') if marker else None
+    news, stopped = [], False
+    try:
+        for item in iter_feed(content):
+            if marker and (item['link'] == marker_link or
+                           (item['published'] and marker_date and item['published'] < marker_date)):
+                stopped = True
+                break
+            news.append(item)
+    except ET.ParseError:
+        metrics.inc("feed_parse_total", caminho="feedparser")
+        return _parse_with_feedparser(content)
+
+    if not stopped:
+        metrics.inc("feed_parse_total", caminho="completo")
+        return news, None
+    metrics.inc("feed_parse_total", caminho="parcial")
+    seen = {n['link'] for n in news}
+    merged = news + [n for n in previous if n.get('link') not in seen]
+    return merged[:max(len(previous), len(news))], None
+
+
+def _parse_with_feedparser(content):
+    import feedparser
+    feed = feedparser.parse(content)
+    if feed.bozo:
+        return None, feed.bozo_exception
+    return [{
+        'title': entry.title,
+        'link': entry.link,
+        'summary': getattr(entry, 'summary', ''),
+        'published': entry_timestamp(entry)
+    } for entry in feed.entries], None
@@ -0,0 +1,96 @@
+"""Controle adaptativo (AIMD) da taxa de requisições à API da Câmara, compartilhado pelo processo."""
+import email.utils
+import os
+import random
+import threading
+import time
+from src.metricas import metrics
+
+# Taxa inicial e limites (req/s); a taxa efetiva é ajustada pelas respostas da API
+CAMARA_INITIAL_RPS = float(os.environ.get("CAMARA_INITIAL_RPS", "4"))
+CAMARA_MIN_RPS = float(os.environ.get("CAMARA_MIN_RPS", "0.5"))
+CAMARA_MAX_RPS = float(os.environ.get("CAMARA_MAX_RPS", "20"))
+# Aumento aditivo por resposta bem-sucedida (req/s) e fator de redução em 429/5xx
+AIMD_INCREASE = 0.05
+AIMD_DECREASE = 0.5
+# Reduções mais próximas que isto contam como um único evento de sobrecarga (s)
+DECREASE_COOLDOWN = 1.0
+# Espera usada em 429/5xx sem Retry-After: 2**tentativa s, até este teto
+MAX_BACKOFF = 30.0
+
+
+def parse_retry_after(value):
+    """Converte o Retry-After (segundos ou data HTTP) em segundos de espera, ou None."""
+    if not value: return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class AIMDRateController:
+    """
+    Token bucket com taxa ajustada por AIMD.
+
+    acquire() bloqueia até haver uma ficha; a taxa cresce AIMD_INCREASE req/s a cada
+    sucesso e é multiplicada por AIMD_DECREASE em 429/5xx (no máximo uma vez por
+    DECREASE_COOLDOWN). Um Retry-After, ou o backoff exponencial na falta dele, pausa
+    todas as threads que usam o controlador.
+    """
+
+    def __init__(self, initial_rps=CAMARA_INITIAL_RPS, min_rps=CAMARA_MIN_RPS, max_rps=CAMARA_MAX_RPS):
+        self.min_rps = min_rps
+        self.max_rps = max_rps
+        self.rate = min(max(initial_rps, min_rps), max_rps)
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+    def _refill(self, now):
+        # Capacidade de 1 s de taxa: permite rajadas curtas sem exceder a média
+        self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return
+                    wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rps, self.rate + AIMD_INCREASE)
+        metrics.gauge("camara_rate_rps", self.rate)
+
+    def on_throttle(self, attempt, retry_after=None):
+        """Reduz a taxa e pausa o controlador. Retorna a pausa aplicada (s)."""
+        pause = retry_after if retry_after is not None else min(MAX_BACKOFF, 2 ** attempt) * random.uniform(0.5, 1.0)
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease >= DECREASE_COOLDOWN:
+                self.rate = max(self.min_rps, self.rate * AIMD_DECREASE)
+                self._last_decrease = now
+            self._paused_until = max(self._paused_until, now + pause)
+            # O balde recomeça vazio ao fim da pausa
+            self._tokens = 0.0
+            self._updated = self._paused_until
+        metrics.gauge("camara_rate_rps", self.rate)
+        return pause
+
+
+# Controlador único: todos os clientes e workers do processo dividem a mesma taxa
+camara_rate = AIMDRateController()
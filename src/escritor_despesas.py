@@ -0,0 +1,92 @@
+"""Pipeline de escrita em lote (upserts em blocos paralelos) para a tabela despesas."""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.metricas import metrics
+
+# Tamanho de cada bloco de upsert e número de escritores simultâneos
+CHUNK_SIZE = 2000
+WRITERS = 3
+MAX_RETRIES = 4
+
+
+class ExpenseWriter:
+    """
+    Acumula linhas limpas de vários deputados e grava blocos de ~chunk_size linhas
+    por um pequeno pool de escritores, com novas tentativas e backoff exponencial.
+
+    Cada chamada de add() pode receber uma etiqueta (ex.: o id do deputado); poll()
+    devolve as etiquetas dos blocos concluídos e se foram gravados com sucesso, para
+    que o chamador só avance checkpoints depois da escrita.
+    """
+
+    def __init__(self, db, table="despesas", on_conflict="id_externo",
+                 chunk_size=CHUNK_SIZE, workers=WRITERS, max_retries=MAX_RETRIES):
+        self.db = db
+        self.table = table
+        self.on_conflict = on_conflict
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        # Limita os blocos em voo para manter a memória limitada se o banco ficar para trás
+        self._slots = threading.Semaphore(workers * 2)
+        self._lock = threading.Lock()
+        self._buffer = {}
+        self._tags = []
+        self._results = []
+        self.rows_written = 0
+        self.chunks_failed = 0
+
+    def add(self, rows, tag=None):
+        """Enfileira linhas (deduplicadas por on_conflict) e grava um bloco quando o buffer enche."""
+        for row in rows:
+            self._buffer[row[self.on_conflict]] = row
+        if tag is not None:
+            self._tags.append(tag)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Envia o conteúdo atual do buffer como um bloco, sem esperar a gravação."""
+        if not self._buffer and not self._tags:
+            return
+        chunk, tags = list(self._buffer.values()), self._tags
+        self._buffer, self._tags = {}, []
+        self._slots.acquire()
+        self._pool.submit(self._write, chunk, tags)
+
+    def _write(self, chunk, tags):
+        ok = not chunk
+        try:
+            for attempt in range(self.max_retries + 1) if chunk else ():
+                try:
+                    with metrics.span("db.upsert", tabela=self.table):
+                        self.db.table(self.table).upsert(chunk, on_conflict=self.on_conflict).execute()
+                    ok = True
+                    break
+                except Exception as e:
+                    metrics.inc("db_upsert_errors_total", tabela=self.table)
+                    if attempt == self.max_retries:
+                        print(f"Erro ao gravar bloco de {len(chunk)} linhas em {self.table}: {e}")
+                    else:
+                        time.sleep(min(30, 2 ** attempt) + random.uniform(0, 1))
+        finally:
+            with self._lock:
+                if ok: self.rows_written += len(chunk)
+                else: self.chunks_failed += 1
+                self._results.extend((tag, ok) for tag in tags)
+            if ok: metrics.inc("rows_written_total", len(chunk), tabela=self.table)
+            else: metrics.inc("chunks_failed_total", tabela=self.table)
+            self._slots.release()
+
+    def poll(self):
+        """Retorna [(etiqueta, sucesso)] dos blocos concluídos desde a última chamada."""
+        with self._lock:
+            results, self._results = self._results, []
+        return results
+
+    def close(self):
+        """Grava o que resta no buffer e espera todos os escritores terminarem."""
+        self.flush()
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,347 @@
+"""Espelho local e colunar da tabela despesas (Parquet particionado por ano/mês) e consultas sobre ele."""
+import argparse
+import datetime
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from src.metricas import metrics
+
+MIRROR_DIR = os.environ.get("MIRROR_DIR", os.path.join(".cache", "colunar"))
+# Linhas em memória antes de o espelho gravar as partições tocadas
+MIRROR_BUFFER_ROWS = 200_000
+PARTITION_FILE = "despesas.parquet"
+META_FILE = "atualizacao.json"
+# Idade máxima do último sync completo para consultar meses ainda abertos (s); os
+# meses fechados não mudam mais e não expiram
+MIRROR_MAX_AGE = 26 * 3600
+COLUMNS = ("id_externo", "deputado_id", "data", "data_emissao", "tipo_despesa", "valor_liquido",
+           "nome_fornecedor", "cnpj_cpf_fornecedor", "url_documento")
+# Colunas agrupáveis nas consultas e o rótulo de cada uma no resultado
+GROUP_KEYS = {"deputado": "deputado_id", "tipo_despesa": "tipo_despesa",
+              "fornecedor": "fornecedor"}
+
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id_externo", pa.string()), ("deputado_id", pa.int64()), ("data", pa.date32()),
+        ("data_emissao", pa.string()), ("tipo_despesa", pa.string()), ("valor_liquido", pa.float64()),
+        ("nome_fornecedor", pa.string()), ("cnpj_cpf_fornecedor", pa.string()),
+        ("url_documento", pa.string()),
+    ])
+
+
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([("ano", pa.int16()), ("mes", pa.int8())]), flavor="hive")
+
+
+def _row_day(row):
+    """Dia da despesa: data de emissão ou, na falta dela, o 1º dia do mês de competência."""
+    if row.get("data_emissao"):
+        try:
+            return datetime.date.fromisoformat(row["data_emissao"][:10])
+        except ValueError:
+            pass
+    return datetime.date(int(row["ano"]), int(row["mes"]), 1)
+
+
+def _partition_path(root, year, month):
+    return os.path.join(root, "despesas", f"ano={year}", f"mes={month:02d}", PARTITION_FILE)
+
+
+class ParquetMirror:
+    """
+    Mantém o espelho a partir das linhas já limpas (mesmo esquema do clean_expense).
+
+    add() acumula linhas por mês; flush() regrava só as partições tocadas, mesclando
+    com o arquivo existente por id_externo. Quando o chamador informa que baixou o
+    mês inteiro de um deputado (replace), as linhas antigas desse deputado no mês são
+    descartadas, para que despesas removidas na origem também sumam do espelho.
+    """
+
+    def __init__(self, root=MIRROR_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._buffer = defaultdict(dict)
+        self._replace = defaultdict(set)
+        self._buffered = 0
+        self.rows_written = 0
+
+    def add(self, rows, replace=None):
+        """Enfileira linhas; replace=(deputado_id, ano, mês) marca o mês do deputado como completo."""
+        with self._lock:
+            if replace:
+                dep_id, year, month = replace
+                self._replace[(year, month)].add(dep_id)
+                self._buffer.setdefault((year, month), {})
+            for row in rows:
+                self._buffer[(row["ano"], row["mes"])][row["id_externo"]] = row
+                self._buffered += 1
+            full = self._buffered >= MIRROR_BUFFER_ROWS
+        if full: self.flush()
+
+    def touch(self, year, month):
+        """Garante a partição do mês no próximo flush, mesmo sem linhas (mês sem despesas)."""
+        with self._lock:
+            self._buffer.setdefault((year, month), {})
+
+    def mark_updated(self):
+        """Registra que um sync completo terminou: os meses abertos do espelho estão em dia."""
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f"_{META_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"atualizado_em": datetime.datetime.now(datetime.timezone.utc).isoformat()}, f)
+        os.replace(tmp_path, os.path.join(self.root, META_FILE))
+
+    def flush(self):
+        with self._lock:
+            buffer, replace = self._buffer, self._replace
+            self._buffer, self._replace, self._buffered = defaultdict(dict), defaultdict(set), 0
+        with metrics.span("espelho.flush", particoes=len(buffer)):
+            for (year, month), rows in buffer.items():
+                self._write_partition(year, month, rows, replace.get((year, month), set()))
+
+    close = flush
+
+    def _write_partition(self, year, month, rows, replaced):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+        schema = _schema()
+        table = pa.Table.from_pylist([{
+            **{c: r.get(c) for c in COLUMNS if c != "data"}, "data": _row_day(r),
+        } for r in rows.values()], schema=schema)
+        path = _partition_path(self.root, year, month)
+        if os.path.exists(path):
+            old = pq.read_table(path, schema=schema)
+            keep = pc.invert(pc.or_(pc.is_in(old["id_externo"], value_set=table["id_externo"]),
+                                    pc.is_in(old["deputado_id"], value_set=pa.array(sorted(replaced), pa.int64()))))
+            table = pa.concat_tables([old.filter(keep), table])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Ordenar por deputado e data melhora a compressão e as estatísticas dos row groups
+        table = table.sort_by([("deputado_id", "ascending"), ("data", "ascending")])
+        # Prefixo "_": arquivos temporários são ignorados na descoberta do dataset
+        tmp_path = os.path.join(os.path.dirname(path), f"_{PARTITION_FILE}.tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+        self.rows_written += len(rows)
+        metrics.inc("espelho_linhas_total", len(rows))
+
+    def months(self):
+        """(ano, mês) das partições presentes no disco."""
+        return _months(self.root)
+
+    def write_deputies(self, deputies):
+        """Grava os dados cadastrais usados para nomear os deputados nos rankings."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist([{k: d.get(k) for k in ("id", "nome", "sigla_partido", "sigla_uf")}
+                                      for d in deputies])
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, "parlamentares.parquet.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(self.root, "parlamentares.parquet"))
+
+
+def _months(root):
+    found = set()
+    base = os.path.join(root, "despesas")
+    for year_dir in os.listdir(base) if os.path.isdir(base) else []:
+        for month_dir in os.listdir(os.path.join(base, year_dir)):
+            if os.path.exists(os.path.join(base, year_dir, month_dir, PARTITION_FILE)):
+                found.add((int(year_dir.split("=")[1]), int(month_dir.split("=")[1])))
+    return found
+
+
+def open_mirror(root=MIRROR_DIR):
+    """ParquetMirror pronto para uso, ou None se o pyarrow não estiver instalado."""
+    try:
+        import pyarrow  # noqa: F401 pylint: disable=unused-import,import-outside-toplevel
+    except ImportError:
+        logging.warning("pyarrow não instalado: espelho colunar de despesas desativado.")
+        return None
+    return ParquetMirror(root)
+
+
+def backfill_months(mirror, db, months):
+    """Preenche pelo Supabase os meses ausentes do espelho (ex.: primeiro uso ou cache perdido)."""
+    from src.materializador_ranking import _fetch_all
+    for year, month in sorted(months):
+        with metrics.span("espelho.backfill", mes=f"{year}-{month:02d}"):
+            rows = _fetch_all(lambda: db.table("despesas").select(", ".join(
+                [c for c in COLUMNS if c != "data"] + ["ano", "mes"]))
+                .eq("ano", year).eq("mes", month).order("id_externo"))
+            mirror.touch(year, month)
+            mirror.add(rows)
+            mirror.flush()
+
+
+# --- Consultas --------------------------------------------------------------
+
+def _dataset(root):
+    import pyarrow.dataset as ds
+    base = os.path.join(root, "despesas")
+    if not os.path.isdir(base): return None
+    return ds.dataset(base, format="parquet", partitioning=_partitioning())
+
+
+def _window_filter(start, end):
+    """Filtro de [start, end]: a parte sobre ano/mês poda partições antes de abrir os arquivos."""
+    import pyarrow.dataset as ds
+    ano, mes, data = ds.field("ano"), ds.field("mes"), ds.field("data")
+    after = (ano > start.year) | ((ano == start.year) & (mes >= start.month))
+    before = (ano < end.year) | ((ano == end.year) & (mes <= end.month))
+    return after & before & (data >= start) & (data <= end)
+
+
+def _group_column(key):
+    """Expressão da coluna de agrupamento; "fornecedor" é derivada na leitura.
+
+    Mesma chave do materializador de ranking: CNPJ/CPF, ou o nome quando o documento
+    falta, ou "NÃO INFORMADO". Assim partições já gravadas servem sem migração.
+    """
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    if key != "fornecedor": return ds.field(key)
+    cnpj = ds.field("cnpj_cpf_fornecedor")
+    name = pc.if_else(pc.is_null(ds.field("nome_fornecedor")) | (ds.field("nome_fornecedor") == ""),
+                      pc.scalar("NÃO INFORMADO"), ds.field("nome_fornecedor"))
+    return pc.if_else(pc.is_null(cnpj) | (cnpj == ""), name, cnpj)
+
+
+def _as_date(value):
+    return datetime.date.fromisoformat(value[:10]) if isinstance(value, str) else value
+
+
+def updated_at(root=MIRROR_DIR):
+    """Epoch do último sync completo registrado no espelho, ou None."""
+    try:
+        with open(os.path.join(root, META_FILE), encoding="utf-8") as f:
+            return datetime.datetime.fromisoformat(json.load(f)["atualizado_em"]).timestamp()
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def covers(start, end, root=MIRROR_DIR, max_age=MIRROR_MAX_AGE):
+    """
+    Indica se o espelho responde pela janela inteira: todo (ano, mês) dela tem partição
+    e, se algum mês ainda está aberto, o último sync completo tem menos de max_age s.
+    """
+    from src.api_client import is_closed_month
+    months, present = [], _months(root)
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    if any(m not in present for m in months):
+        return False
+    if all(is_closed_month(y, m) for y, m in months): return True
+    stamp = updated_at(root)
+    return stamp is not None and datetime.datetime.now().timestamp() - stamp <= max_age
+
+
+def window_sum(start, end=None, by=None, root=MIRROR_DIR):
+    """
+    Soma das despesas com data em [start, end], opcionalmente agrupada.
+
+    Args:
+        start, end (date ou str ISO): Janela inclusiva; end padrão é hoje.
+        by (str, opcional): "deputado", "tipo_despesa" ou "fornecedor".
+
+    Returns:
+        dict {"total_gasto", "quantidade"} sem agrupamento; pyarrow.Table com
+        chave, total_gasto e quantidade (ordem decrescente de total) com agrupamento;
+        None se o pyarrow não estiver instalado ou o espelho não cobrir a janela (meses
+        ausentes ou desatualizados, ver covers), para que o chamador use outra fonte.
+    """
+    try:
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+        dataset = _dataset(root)
+    except ImportError:
+        return None
+    if dataset is None: return None
+    start, end = _as_date(start), _as_date(end or datetime.date.today())
+    if not covers(start, end, root):
+        metrics.inc("espelho_consulta_recusada_total")
+        return None
+    key = GROUP_KEYS[by] if by else None
+    with metrics.span("espelho.consulta", agrupamento=by or "total"):
+        columns = {"valor_liquido": ds.field("valor_liquido")}
+        if key: columns[key] = _group_column(key)
+        table = dataset.to_table(columns=columns, filter=_window_filter(start, end))
+        if key is None:
+            return {"total_gasto": round(pc.sum(table["valor_liquido"]).as_py() or 0.0, 2),
+                    "quantidade": table.num_rows}
+        grouped = table.group_by(key).aggregate([("valor_liquido", "sum"), ("valor_liquido", "count")])
+        grouped = grouped.rename_columns([{"valor_liquido_sum": "total_gasto",
+                                           "valor_liquido_count": "quantidade"}.get(c, c)
+                                          for c in grouped.column_names])
+        return grouped.sort_by([("total_gasto", "descending")])
+
+
+def _deputies(root):
+    import pyarrow.parquet as pq
+    path = os.path.join(root, "parlamentares.parquet")
+    if not os.path.exists(path): return {}
+    return {d["id"]: d for d in pq.read_table(path).to_pylist()}
+
+
+def top_spenders(start, end=None, n=10, by="deputado", root=MIRROR_DIR):
+    """
+    Top-N da janela em uma dimensão, no formato da RPC get_top_spenders.
+
+    Para deputados, cada item traz id, nome, sigla_partido, sigla_uf e total_gasto;
+    nas demais dimensões, chave, total_gasto e quantidade. None se o espelho não cobrir a janela.
+    """
+    grouped = window_sum(start, end, by=by, root=root)
+    if grouped is None: return None
+    top = grouped.slice(0, n).to_pylist()
+    key = GROUP_KEYS[by]
+    if by != "deputado":
+        return [{"chave": r[key], "total_gasto": round(r["total_gasto"], 2),
+                 "quantidade": r["quantidade"]} for r in top]
+    deputies = _deputies(root)
+    # Sem o cadastro não há como nomear os deputados; o chamador usa outra fonte
+    if not deputies: return None
+    return [{"id": r[key], "nome": deputies.get(r[key], {}).get("nome"),
+             "sigla_partido": deputies.get(r[key], {}).get("sigla_partido"),
+             "sigla_uf": deputies.get(r[key], {}).get("sigla_uf"),
+             "total_gasto": round(r["total_gasto"], 2)} for r in top]
+
+
+def category_totals(start, end=None, root=MIRROR_DIR):
+    """Total por tipo_despesa na janela, em ordem decrescente. None se o espelho não cobrir a janela."""
+    grouped = window_sum(start, end, by="tipo_despesa", root=root)
+    if grouped is None: return None
+    return [{"tipo_despesa": r["tipo_despesa"], "total_gasto": round(r["total_gasto"], 2),
+             "quantidade": r["quantidade"]} for r in grouped.to_pylist()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Espelho colunar local da tabela despesas.")
+    parser.add_argument("--anos", type=int, nargs="+", required=True,
+                        help="Baixa do Supabase os meses destes anos ausentes do espelho.")
+    args = parser.parse_args()
+    from dotenv import load_dotenv
+    from src.api_client import SentinelAPIClient
+    load_dotenv()
+    client = SentinelAPIClient()
+    mirror = open_mirror()
+    if not client.db or mirror is None: return
+    today = datetime.date.today()
+    wanted = {(y, m) for y in args.anos for m in range(1, 13) if (y, m) <= (today.year, today.month)}
+    try:
+        backfill_months(mirror, client.db, wanted - mirror.months())
+        mirror.write_deputies(client.db.table("parlamentares")
+                              .select("id, nome, sigla_partido, sigla_uf").execute().data)
+    finally:
+        metrics.export("espelho")
+
+
+if __name__ == "__main__":
+    main()
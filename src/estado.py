@@ -0,0 +1,88 @@
+"""Estado do bot (tabela bot_state) carregado uma vez por execução, com escrita adiada."""
+import copy
+import threading
+
+# Redes além do X com outbox e quarentena próprios (src.publicadores)
+_OTHER_NETWORKS = ("bluesky", "mastodon", "telegram", "local")
+# Chaves lidas em uma única consulta no início de cada ciclo
+STATE_KEYS = ("twitter_tokens", "rate_limit_lock", "posted_news", "posted_minhash", "ranking_queue",
+              "x_outbox") + tuple(f"{n}_outbox" for n in _OTHER_NETWORKS) + \
+             tuple(f"rate_limit_lock_{n}" for n in _OTHER_NETWORKS)
+
+
+class RunState:
+    """
+    Snapshot do bot_state para uma execução.
+
+    As chaves são carregadas em lote, as leituras são servidas da memória e as escritas
+    apenas marcam a chave como alterada; commit() grava todas as alteradas em um único
+    upsert. Chaves fora da lista inicial são carregadas sob demanda na primeira leitura.
+
+    Os workers dos outboxes fazem commit em paralelo: os commits são serializados, e
+    uma chave só deixa de estar pendente se não foi alterada durante o upsert.
+    """
+
+    def __init__(self, db, keys=STATE_KEYS):
+        self.db = db
+        self._values = {}
+        self._loaded = set()
+        self._dirty = set()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self.load(keys)
+
+    def load(self, keys):
+        keys = [k for k in keys if k not in self._loaded]
+        if not keys: return
+        try:
+            res = self.db.table("bot_state").select("key, value").in_("key", keys).execute()
+            with self._lock:
+                for row in res.data:
+                    self._values.setdefault(row["key"], row["value"])
+                self._loaded.update(keys)
+        except Exception as e:
+            print(f"Erro ao carregar estado ({', '.join(keys)}): {e}")
+
+    def reload(self, keys):
+        """Relê chaves do banco, descartando os valores em memória que não estejam pendentes."""
+        try:
+            res = self.db.table("bot_state").select("key, value").in_("key", list(keys)).execute()
+            with self._lock:
+                for row in res.data:
+                    if row["key"] not in self._dirty:
+                        self._values[row["key"]] = row["value"]
+                self._loaded.update(keys)
+        except Exception as e:
+            print(f"Erro ao recarregar estado ({', '.join(keys)}): {e}")
+
+    def get(self, key, default=None):
+        if key not in self._loaded: self.load([key])
+        with self._lock:
+            # Cópia para que alterações do chamador só valham após set()
+            return copy.deepcopy(self._values.get(key, default))
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = copy.deepcopy(value)
+            self._loaded.add(key)
+            self._dirty.add(key)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def commit(self):
+        """Grava as chaves alteradas em um único upsert. Retorna True em caso de sucesso."""
+        # Serializado: upserts simultâneos poderiam chegar fora de ordem e gravar um valor antigo
+        with self._commit_lock:
+            with self._lock:
+                rows = [{"key": k, "value": self._values[k]} for k in sorted(self._dirty)]
+                versions = {k: self._versions.get(k) for k in self._dirty}
+            if not rows: return True
+            try:
+                self.db.table("bot_state").upsert(rows).execute()
+            except Exception as e:
+                print(f"Erro ao gravar estado: {e}")
+                return False
+            with self._lock:
+                # Chaves alteradas durante o upsert continuam pendentes para o próximo commit
+                self._dirty.difference_update(k for k, v in versions.items() if self._versions.get(k) == v)
+        return True
@@ -0,0 +1,300 @@
+"""Estatísticas incrementais das despesas (média, variância e quantis em streaming) e detecção de outliers."""
+import array
+import datetime
+import hashlib
+import logging
+import math
+import os
+from src.metricas import metrics
+
+STATS_KEY = "despesas_stats"
+ANOMALIES_KEY = "despesas_anomalias"
+# Um recibo é atípico se ficar acima do p99 do deputado e este número de desvios-padrão
+# acima da média dele em escala logarítmica (os valores têm cauda longa à direita)
+STATS_Z_THRESHOLD = float(os.environ.get("STATS_Z_THRESHOLD", "4"))
+# Despesas já vistas de um deputado antes de a média dele servir de referência
+STATS_MIN_COUNT = int(os.environ.get("STATS_MIN_COUNT", "30"))
+# Fornecedores mantidos no estado (os de menos despesas são descartados primeiro)
+STATS_MAX_SUPPLIERS = int(os.environ.get("STATS_MAX_SUPPLIERS", "2000"))
+QUANTILES = (0.5, 0.9, 0.99)
+MAX_ANOMALIES = 200
+# Chaves (64 bits) das despesas já contadas, um arquivo binário por mês; ficam fora do
+# bot_state, que guarda só quantas chaves cada mês deve ter
+STATS_SEEN_DIR = os.environ.get("STATS_SEEN_DIR", os.path.join(".cache", "estatisticas"))
+GROUPS = ("deputado", "tipo_despesa", "fornecedor")
+
+
+class P2Quantile:
+    """
+    Estimador P² (Jain & Chlamtac) de um quantil: cinco marcadores, O(1) por valor.
+
+    Até a quinta observação guarda os valores e responde com o quantil exato.
+    """
+
+    def __init__(self, p, saved=None):
+        self.p = p
+        self.count, self.q, self.pos = (saved or (0, [], []))
+        self.q, self.pos = list(self.q), list(self.pos)
+
+    def _desired(self):
+        c, p = self.count - 1, self.p
+        return (1, 1 + c * p / 2, 1 + c * p, 1 + c * (1 + p) / 2, 1 + c)
+
+    def add(self, x):
+        self.count += 1
+        q, pos = self.q, self.pos
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            if self.count == 5: pos[:] = [1, 2, 3, 4, 5]
+            return
+        if x < q[0]:
+            q[0], k = x, 0
+        elif x >= q[4]:
+            q[4], k = x, 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        desired = self._desired()
+        for i in (1, 2, 3):
+            d = desired[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                s = 1 if d > 0 else -1
+                # Interpolação parabólica; se sair da ordem dos vizinhos, linear
+                qp = q[i] + s / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + s) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i]) +
+                    (pos[i + 1] - pos[i] - s) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + s * (q[i + s] - q[i]) / (pos[i + s] - pos[i])
+                q[i] = qp
+                pos[i] += s
+
+    def value(self):
+        if not self.count: return None
+        if self.count < 5:
+            return self.q[min(len(self.q) - 1, max(0, math.ceil(self.p * len(self.q)) - 1))]
+        return self.q[2]
+
+    def to_state(self):
+        return [self.count, [round(v, 2) for v in self.q], self.pos]
+
+
+class RunningStats:
+    """Contagem, soma, mínimo, máximo, média e variância (Welford) e quantis P² de uma série."""
+
+    def __init__(self, saved=None):
+        saved = saved or {}
+        self.n = saved.get("n", 0)
+        self.mean = saved.get("media", 0.0)
+        self.m2 = saved.get("m2", 0.0)
+        self.total = saved.get("soma", 0.0)
+        self.min = saved.get("min")
+        self.max = saved.get("max")
+        self.last_seen = saved.get("visto", 0)
+        # Média e variância de log(valor), usadas na detecção de outliers
+        self.log_mean = saved.get("log_media", 0.0)
+        self.log_m2 = saved.get("log_m2", 0.0)
+        self.quantiles = {p: P2Quantile(p, saved.get("q", {}).get(str(p))) for p in QUANTILES}
+
+    def add(self, x, now=0):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.total += x
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        self.last_seen = now or self.last_seen
+        log_x = math.log(x)
+        log_delta = log_x - self.log_mean
+        self.log_mean += log_delta / self.n
+        self.log_m2 += log_delta * (log_x - self.log_mean)
+        for sketch in self.quantiles.values():
+            sketch.add(x)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def log_zscore(self, x):
+        """Desvios-padrão de log(x) acima da média dos logs; None sem dispersão suficiente."""
+        log_std = math.sqrt(self.log_m2 / (self.n - 1)) if self.n > 1 else 0.0
+        return (math.log(x) - self.log_mean) / log_std if log_std else None
+
+    def quantile(self, p):
+        return self.quantiles[p].value()
+
+    def to_state(self):
+        return {"n": self.n, "media": round(self.mean, 4), "m2": round(self.m2, 4),
+                "soma": round(self.total, 2), "min": self.min, "max": self.max, "visto": self.last_seen,
+                "log_media": round(self.log_mean, 6), "log_m2": round(self.log_m2, 6),
+                "q": {str(p): s.to_state() for p, s in self.quantiles.items()}}
+
+
+def _row_key(id_externo):
+    """Chave de 64 bits de uma despesa: colisões são desprezíveis mesmo com milhões de linhas."""
+    return int.from_bytes(hashlib.blake2b(id_externo.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _seen_path(seen_dir, month):
+    return os.path.join(seen_dir, f"vistos-{month}.bin")
+
+
+def _read_seen(seen_dir, month):
+    keys = array.array("Q")
+    try:
+        with open(_seen_path(seen_dir, month), "rb") as f:
+            keys.frombytes(f.read())
+    except OSError:
+        pass
+    return set(keys)
+
+
+class ExpenseStats:
+    """
+    Distribuição dos valores por deputado, tipo_despesa e fornecedor, atualizada linha a linha.
+
+    As linhas chegam do sync já limpas. Como os meses abertos são baixados de novo a
+    cada execução, guarda por mês as chaves dos id_externo já contados (em STATS_SEEN_DIR)
+    e ignora as repetições; os meses que saem da janela do sync têm o arquivo apagado.
+    Se o arquivo de um mês se perder (cache do CI expirado), não há como saber o que já
+    foi contado: o mês é ignorado até sair da janela, subestimando em vez de contar duas vezes.
+    Cada linha nova é comparada com a distribuição do seu deputado *antes* de
+    entrar nela: acima do p99 dele e a STATS_Z_THRESHOLD desvios da média dos logs,
+    vira anomalia. Valores <= 0 (estornos e ajustes) ficam fora das estatísticas.
+    """
+
+    def __init__(self, saved=None, seen_dir=STATS_SEEN_DIR):
+        saved = saved or {}
+        self.groups = {g: {k: RunningStats(v) for k, v in saved.get(g, {}).items()} for g in GROUPS}
+        self.seen_dir = seen_dir
+        # mês -> quantidade de chaves gravadas no último estado salvo
+        self.seen_counts = dict(saved.get("vistos", {}))
+        self.lost = set(saved.get("perdidos", []))
+        self.seen = {}
+        self.anomalies = []
+        self.rows_added = self.flagged = 0
+
+    def _keys(self, row):
+        return (str(row["deputado_id"]), row.get("tipo_despesa") or "Outros",
+                row.get("cnpj_cpf_fornecedor") or row.get("nome_fornecedor") or "NÃO INFORMADO")
+
+    def update(self, rows):
+        """Contabiliza as linhas ainda não vistas. Retorna as anomalias encontradas nelas."""
+        found = []
+        now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+        for row in rows:
+            month = f"{row['ano']}-{int(row['mes']):02d}"
+            seen = self._seen_for(month)
+            if seen is None: continue
+            h = _row_key(row["id_externo"])
+            if h in seen: continue
+            seen.add(h)
+            value = float(row.get("valor_liquido") or 0)
+            if value <= 0: continue
+            keys = self._keys(row)
+            baseline = self.groups["deputado"].get(keys[0])
+            if baseline and baseline.n >= STATS_MIN_COUNT and value > baseline.quantile(0.99):
+                z = baseline.log_zscore(value)
+                if z is not None and z >= STATS_Z_THRESHOLD:
+                    found.append(self._anomaly(row, z, baseline, keys[1]))
+            for group, key in zip(GROUPS, keys):
+                stats = self.groups[group].get(key)
+                if stats is None: stats = self.groups[group][key] = RunningStats()
+                stats.add(value, now)
+            self.rows_added += 1
+        if found:
+            metrics.inc("despesas_anomalias_total", len(found))
+            self.flagged += len(found)
+            self.anomalies.extend(found)
+        return found
+
+    def _seen_for(self, month):
+        """Chaves já contadas do mês (lidas do disco na primeira vez), ou None se o mês foi perdido."""
+        if month in self.lost: return None
+        if month not in self.seen:
+            keys = _read_seen(self.seen_dir, month)
+            # O arquivo é gravado antes do estado: pode ter chaves a mais, nunca a menos
+            if len(keys) < self.seen_counts.get(month, 0):
+                logging.warning("Chaves já contadas de %s perdidas; o mês fica fora das estatísticas.", month)
+                self.lost.add(month)
+                return None
+            self.seen[month] = keys
+        return self.seen[month]
+
+    def _anomaly(self, row, z, baseline, tipo):
+        tipo_stats = self.groups["tipo_despesa"].get(tipo)
+        return {
+            "id_externo": row["id_externo"],
+            "deputado_id": row["deputado_id"],
+            "data_emissao": row.get("data_emissao"),
+            "tipo_despesa": tipo,
+            "nome_fornecedor": row.get("nome_fornecedor"),
+            "valor_liquido": row.get("valor_liquido"),
+            "z_log": round(z, 1),
+            "media_deputado": round(baseline.mean, 2),
+            "p99_deputado": baseline.quantile(0.99),
+            "p99_tipo": tipo_stats.quantile(0.99) if tipo_stats else None,
+            "detectado_em": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+
+    def get(self, group, key):
+        """RunningStats de um deputado (id), tipo_despesa ou fornecedor (CNPJ/CPF), ou None."""
+        return self.groups[group].get(str(key) if group == "deputado" else key)
+
+    def save_seen(self, active_months):
+        """Grava as chaves dos meses em active_months ("AAAA-MM") e apaga as dos demais."""
+        os.makedirs(self.seen_dir, exist_ok=True)
+        for month in set(self.seen_counts) | set(self.seen):
+            if month not in active_months:
+                self.seen.pop(month, None)
+                self.seen_counts.pop(month, None)
+                try:
+                    os.remove(_seen_path(self.seen_dir, month))
+                except OSError:
+                    pass
+        self.lost &= set(active_months)
+        for month, keys in self.seen.items():
+            if len(keys) == self.seen_counts.get(month): continue
+            tmp_path = os.path.join(self.seen_dir, f"_vistos-{month}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(array.array("Q", sorted(keys)).tobytes())
+            os.replace(tmp_path, _seen_path(self.seen_dir, month))
+            self.seen_counts[month] = len(keys)
+
+    def to_state(self):
+        """Estado serializável (sem as chaves já contadas, gravadas por save_seen)."""
+        suppliers = self.groups["fornecedor"]
+        if len(suppliers) > STATS_MAX_SUPPLIERS:
+            keep = sorted(suppliers, key=lambda k: (suppliers[k].n, suppliers[k].last_seen),
+                          reverse=True)[:STATS_MAX_SUPPLIERS]
+            self.groups["fornecedor"] = {k: suppliers[k] for k in keep}
+        state = {g: {k: s.to_state() for k, s in stats.items()} for g, stats in self.groups.items()}
+        state["vistos"] = dict(self.seen_counts)
+        state["perdidos"] = sorted(self.lost)
+        return state
+
+
+def load_stats(client):
+    return ExpenseStats(client.state.get(STATS_KEY))
+
+
+def save_stats(client, stats, active_months):
+    """Agenda o estado e as anomalias novas (as MAX_ANOMALIES mais recentes) para o próximo commit.
+
+    As chaves já contadas vão para o disco antes: se a execução cair entre as duas gravações,
+    o arquivo fica com chaves a mais (linhas não contadas), nunca a menos.
+    """
+    try:
+        stats.save_seen(active_months)
+    except OSError as e:
+        logging.error("Falha ao gravar as despesas já contadas: %s", e)
+        return
+    client.state.set(STATS_KEY, stats.to_state())
+    if stats.anomalies:
+        previous = client.state.get(ANOMALIES_KEY) or []
+        known = {a["id_externo"] for a in previous}
+        fresh = [a for a in stats.anomalies if a["id_externo"] not in known]
+        client.state.set(ANOMALIES_KEY, (previous + fresh)[-MAX_ANOMALIES:])
+        stats.anomalies = []
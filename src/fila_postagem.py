@@ -0,0 +1,161 @@
+"""Outbox persistente das threads a postar, enviadas em segundo plano conforme o rate limit da rede."""
+import datetime
+import os
+import random
+import threading
+import time
+import uuid
+from src.metricas import metrics
+
+OUTBOX_KEY = "x_outbox"
+# Intervalo entre tweets de uma mesma thread: mínimo + jitter aleatório (s)
+OUTBOX_MIN_GAP = float(os.environ.get("OUTBOX_MIN_GAP", "3"))
+OUTBOX_JITTER = float(os.environ.get("OUTBOX_JITTER", "7"))
+# Threads pendentes a partir das quais novas postagens são adiadas
+OUTBOX_MAX_PENDING = int(os.environ.get("OUTBOX_MAX_PENDING", "3"))
+# Tempo máximo (s) que o cron espera o envio ao final; o restante fica para a próxima execução
+OUTBOX_MAX_WAIT = float(os.environ.get("OUTBOX_MAX_WAIT", "180"))
+OUTBOX_MAX_ATTEMPTS = 3
+
+
+class Outbox:
+    """
+    Fila de threads de uma rede, guardada no bot_state (chave x_outbox para o X).
+
+    Cada item guarda os textos da thread, os IDs já postados e o horário do próximo envio.
+    Um worker em segundo plano envia o próximo post devido de cada thread pelo
+    `send(texto, responder_a, raiz)` da rede, que retorna (status, id, liberado_em). O
+    horário do próximo envio vem dos cabeçalhos de rate limit; threads interrompidas
+    continuam de onde pararam na execução seguinte, respondendo ao último post.
+    """
+
+    def __init__(self, state, send, lock_until=None, key=OUTBOX_KEY, name="x"):
+        self.state = state
+        self.send = send
+        self.key = key
+        self.name = name
+        # Função que retorna até quando (epoch) o envio está bloqueado, se estiver
+        self.lock_until = lock_until or (lambda: None)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker = None
+        self._running = False
+        self.items = list(state.get(key) or [])
+
+    def pending(self):
+        with self._lock:
+            return len(self.items)
+
+    def enqueue(self, tweets, origem=None):
+        """Adiciona uma thread ao outbox e grava já. Retorna o id do item."""
+        item = {
+            "id": uuid.uuid4().hex[:12],
+            "origem": origem,
+            "segmentos": list(tweets),
+            "ids": [],
+            "proximo": time.time(),
+            "tentativas": 0,
+            "criado": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+        with self._lock:
+            self.items.append(item)
+        self._persist()
+        self._wake.set()
+        return item["id"]
+
+    def _persist(self):
+        with self._lock:
+            self.state.set(self.key, self.items)
+        self.state.commit()
+        metrics.gauge("outbox_pending", len(self.items), rede=self.name)
+
+    def _next_due(self):
+        """Retorna (item, espera): o item mais atrasado já devido, ou quanto esperar pelo próximo."""
+        with self._lock:
+            if not self.items:
+                # Encerra o worker sob o lock: um enqueue concorrente verá _running False
+                self._running = False
+                return None, None
+            item = min(self.items, key=lambda i: i["proximo"])
+        now = time.time()
+        start = max(item["proximo"], self.lock_until() or 0)
+        if start > now: return None, start - now
+        return item, 0
+
+    def _send_next(self, item):
+        index = len(item["ids"])
+        reply_to = item["ids"][-1] if item["ids"] else None
+        root = item["ids"][0] if item["ids"] else None
+        status, tweet_id, free_at = self.send(item["segmentos"][index], reply_to, root)
+        now = time.time()
+        with self._lock:
+            if status == "ok":
+                item["ids"].append(tweet_id)
+                item["tentativas"] = 0
+                item["proximo"] = max(now + OUTBOX_MIN_GAP + random.uniform(0, OUTBOX_JITTER), free_at or 0)
+                if len(item["ids"]) == len(item["segmentos"]):
+                    self.items.remove(item)
+                    metrics.inc("outbox_threads_total", rede=self.name, resultado="ok")
+                    print(f"[{self.name}] Thread {item['id']} concluída ({len(item['ids'])} posts).")
+            elif status == "sem_cliente":
+                pass
+            elif status == "rate_limit":
+                item["proximo"] = free_at
+            elif status == "duplicate":
+                # Conteúdo já publicado: a thread não tem como continuar
+                self.items.remove(item)
+                metrics.inc("outbox_threads_total", rede=self.name, resultado="duplicate")
+            else:
+                item["tentativas"] += 1
+                item["proximo"] = now + 60 * item["tentativas"]
+                if item["tentativas"] >= OUTBOX_MAX_ATTEMPTS:
+                    self.items.remove(item)
+                    metrics.inc("outbox_threads_total", rede=self.name, resultado="erro")
+                    print(f"[{self.name}] Thread {item['id']} descartada após {OUTBOX_MAX_ATTEMPTS} tentativas.")
+        # Grava após cada envio: um tweet postado sem registro seria repetido ao retomar
+        self._persist()
+        return status
+
+    def _run(self):
+        while not self._stop.is_set():
+            item, wait = self._next_due()
+            if item is None:
+                if wait is None: break
+                self._wake.wait(min(wait, 5))
+                self._wake.clear()
+                continue
+            if self._send_next(item) == "sem_cliente": break
+        with self._lock:
+            self._running = False
+
+    def start(self):
+        """Inicia (ou reaproveita) o worker de envio em segundo plano."""
+        with self._lock:
+            if not self.items: return
+            if self._running:
+                self._wake.set()
+                return
+            self._running = True
+        if self._worker: self._worker.join()
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name=f"outbox-{self.name}", daemon=True)
+        self._worker.start()
+
+    def join(self, timeout):
+        if self._worker: self._worker.join(timeout)
+
+    def wait(self, timeout=OUTBOX_MAX_WAIT):
+        """Espera o worker esvaziar o outbox por até `timeout` s; o que sobrar continua pendente."""
+        self.join(timeout)
+        return self.stop()
+
+    def stop(self):
+        """Interrompe o worker após o envio em andamento. Retorna as threads pendentes."""
+        if self._worker:
+            self._stop.set()
+            self._wake.set()
+            self._worker.join()
+        left = self.pending()
+        if left: print(f"[{self.name}] Outbox: {left} thread(s) pendente(s) para a próxima execução.")
+        return left
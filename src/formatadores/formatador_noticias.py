@@ -1,5 +1,7 @@
 """Módulo para formatar notícias em threads para redes sociais."""
+import html
 import logging
+import re
 import textwrap
 
 
@@ -8,21 +10,29 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Constantes para os limites e textos padrão
 MAX_TWEET_LENGTH = 280
 
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def strip_html(text):
+    """Remove tags e entidades HTML e normaliza os espaços."""
+    return " ".join(html.unescape(_TAG_RE.sub(" ", text or "")).split())
+
 
 def format_news_thread(article):
     """
     Formata uma notícia em uma lista de até 3 tweets para uma thread.
 
     Args:
-        article (dict): Um dicionário contendo 'title', 'link' e 'summary'.
+        article (dict): Um dicionário contendo 'title', 'link' e 'summary', e
+            opcionalmente 'lead' (resumo obtido da página pelo enriquecimento).
 
     Returns:
         list: Uma lista de strings, onde cada string é um tweet.
     """
     title = article['title'].strip()
     link = article['link']
-    # O resumo de feeds RSS pode conter HTML, uma limpeza básica é útil
-    summary = article['summary'].strip()  # Idealmente, usaríamos uma lib para remover HTML
+    # O resumo da página tem prioridade; o do feed RSS costuma vir vazio ou com HTML
+    summary = article.get('lead') or strip_html(article['summary'])
 
     # --- Tweet 1: Manchete ---
     header = f"📰 Notícia: {title}"
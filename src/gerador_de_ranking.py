@@ -1,14 +1,14 @@
 """Módulo para gerar um ranking de gastos de deputados."""
 import json
 import time
-from src.api_client import get_deputies_list, get_deputy_expenses
+from src.api_client import SentinelAPIClient
 
 
 RANKING_FILE = 'ranking_gastos.json'
 
 
 def calculate_total_spent(expenses):
-    """Calcula o total gasto a partir de uma lista de despesas."""
+    """Calcula o total gasto a partir de uma lista (ou gerador) de despesas."""
     return sum(expense['valorLiquido'] for expense in expenses)
 
 
@@ -17,7 +17,8 @@ def main():
     print("Iniciando a geração do ranking de gastos. "
           "Este processo pode levar vários minutos...")
 
-    deputies = get_deputies_list()
+    client = SentinelAPIClient()
+    deputies = client.get_deputies_list()
     if not deputies:
         print("Não foi possível obter a lista de deputados. Encerrando.")
         return
@@ -33,7 +34,8 @@ def main():
         print(f"Processando [{i+1}/{total_deputies}]: {deputy_name}...",
               end="", flush=True)
 
-        expenses = get_deputy_expenses(deputy_id)
+        # Consome as despesas página a página, sem manter a lista inteira em memória
+        expenses = client.iter_deputy_expenses(deputy_id, prefetch=True)
         total_spent = calculate_total_spent(expenses)
 
         if total_spent > 0:
@@ -0,0 +1,143 @@
+"""Carga em massa das despesas a partir dos arquivos anuais da Cota Parlamentar (Ano-AAAA.csv.zip)."""
+import argparse
+import csv
+import io
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from collections import defaultdict
+from dotenv import load_dotenv
+from src.api_client import SentinelAPIClient
+from src.escritor_despesas import ExpenseWriter
+from src.espelho_despesas import open_mirror
+from src.metricas import metrics
+from src.sync_data import clean_expense
+
+load_dotenv()
+
+BULK_URL = "https://www.camara.leg.br/cotas/Ano-{year}.csv.zip"
+# Linhas brutas acumuladas antes de limpar e enfileirar para gravação
+BATCH_ROWS = 5000
+
+# Coluna do CSV -> campo equivalente da API de despesas, para que o clean_expense
+# gere o mesmo id_externo que a sincronização pela API
+CSV_TO_API = {
+    "txtDescricao": "tipoDespesa",
+    "txtFornecedor": "nomeFornecedor",
+    "txtCNPJCPF": "cnpjCpfFornecedor",
+    "txtNumero": "numDocumento",
+    "ideDocumento": "codDocumento",
+    "numLote": "codLote",
+    "datEmissao": "dataDocumento",
+    "vlrLiquido": "valorLiquido",
+    "urlDocumento": "urlDocumento",
+}
+
+
+def _to_api_record(row):
+    record = {api: row.get(col) or None for col, api in CSV_TO_API.items()}
+    if record["valorLiquido"]:
+        record["valorLiquido"] = record["valorLiquido"].replace(",", ".")
+    return record
+
+
+def iter_bulk_rows(zip_path):
+    """Lê o CSV de dentro do ZIP linha a linha, sem extraí-lo para o disco."""
+    with zipfile.ZipFile(zip_path) as archive:
+        member = next(n for n in archive.namelist() if n.lower().endswith(".csv"))
+        with archive.open(member) as raw:
+            reader = csv.DictReader(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""),
+                                    delimiter=";")
+            yield from reader
+
+
+def _flush(batch, writer, mirror=None):
+    """Limpa as linhas acumuladas, agrupadas por (deputado, ano, mês), e as enfileira."""
+    for (dep_id, year, month), records in batch.items():
+        rows = [clean_expense(e, dep_id, year, month) for e in records]
+        writer.add(rows)
+        if mirror: mirror.add(rows)
+    batch.clear()
+
+
+def ingest_bulk_file(client, zip_path, months=None):
+    """
+    Ingere um arquivo anual da Cota Parlamentar na tabela despesas.
+
+    Args:
+        zip_path (str): Caminho local do Ano-AAAA.csv.zip.
+        months (set, opcional): Restringe a carga a esses meses.
+
+    Returns:
+        int: Linhas gravadas.
+    """
+    writer = ExpenseWriter(client.db)
+    mirror = open_mirror()
+    batch = defaultdict(list)
+    n_read = n_skipped = pending = 0
+    start = time.monotonic()
+
+    with metrics.span("bulk.ingest", arquivo=os.path.basename(zip_path)):
+        for row in iter_bulk_rows(zip_path):
+            n_read += 1
+            # Despesas de lideranças não têm deputado associado
+            if not row.get("ideCadastro") or not row.get("numAno") or not row.get("numMes"):
+                n_skipped += 1
+                continue
+            month = int(row["numMes"])
+            if months and month not in months: continue
+            batch[(int(row["ideCadastro"]), int(row["numAno"]), month)].append(_to_api_record(row))
+            pending += 1
+            if pending >= BATCH_ROWS:
+                _flush(batch, writer, mirror)
+                pending = 0
+        _flush(batch, writer, mirror)
+        writer.close()
+        if mirror: mirror.close()
+
+    metrics.inc("rows_fetched_total", n_read, fonte="bulk")
+    elapsed = max(time.monotonic() - start, 1e-9)
+    print(f"Carga concluída em {elapsed:.1f}s: {n_read} linhas lidas, {n_skipped} sem deputado, "
+          f"{writer.rows_written} gravadas ({writer.rows_written / elapsed:.1f} linhas/s), "
+          f"{writer.chunks_failed} blocos com falha.")
+    return writer.rows_written
+
+
+def download_bulk_file(year, directory):
+    """Baixa o Ano-AAAA.csv.zip em streaming para um arquivo local."""
+    import requests
+    url = BULK_URL.format(year=year)
+    path = os.path.join(directory, os.path.basename(url))
+    print(f"Baixando {url}...")
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga em massa da Cota Parlamentar.")
+    parser.add_argument("arquivo", nargs="?", help="Caminho local do Ano-AAAA.csv.zip.")
+    parser.add_argument("--ano", type=int, help="Baixa o arquivo do ano indicado no portal da Câmara.")
+    parser.add_argument("--meses", type=int, nargs="*", help="Restringe a carga a estes meses.")
+    args = parser.parse_args()
+    if not args.arquivo and not args.ano:
+        parser.error("informe o caminho do arquivo ou --ano")
+
+    client = SentinelAPIClient()
+    if not client.db: return
+    try:
+        if args.arquivo:
+            ingest_bulk_file(client, args.arquivo, set(args.meses or []))
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                ingest_bulk_file(client, download_bulk_file(args.ano, tmp), set(args.meses or []))
+    finally:
+        metrics.export("bulk")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,41 @@
+import time
+_STARTED = time.perf_counter()
+
 import datetime
 import logging
+import sys
 from dotenv import load_dotenv
 from src.api_client import SentinelAPIClient
+from src.espelho_despesas import top_spenders
+from src.fila_postagem import OUTBOX_MAX_WAIT
+from src.materializador_ranking import RANKING_INDEX_KEY, get_ranking
+from src.metricas import metrics
 from main_noticias import run_news_bot
 
 load_dotenv()
 
+# Custo de partida do cron: importações e tempo até o primeiro trabalho útil
+IMPORT_SECONDS = time.perf_counter() - _STARTED
+
 def get_state(client, key):
-    try:
-        res = client.db.table("bot_state").select("value").eq("key", key).execute()
-        return res.data[0]["value"] if res.data else None
-    except Exception: return None
+    return client.state.get(key)
 
 def save_state(client, key, value):
-    try:
-        client.db.table("bot_state").upsert({"key": key, "value": value}).execute()
-    except Exception: pass
+    # Escrita adiada: gravada no commit ao final do ciclo
+    client.state.set(key, value)
 
 def generate_ranking(client):
+    # Usa o ranking pré-calculado pelo sync diário (se tiver menos de um dia); o espelho local
+    # e a RPC ficam como alternativas
+    queue = get_ranking(get_state(client, RANKING_INDEX_KEY), "deputado", 7)
     start_date = (datetime.datetime.now() - datetime.timedelta(days=7)).date().isoformat()
+    if not queue:
+        queue = top_spenders(start_date, n=10)
+    if queue:
+        queue = queue[::-1]
+        save_state(client, "ranking_queue", queue)
+        return queue
+
     try:
         res = client.db.rpc("get_top_spenders", {"start_date": start_date, "limit_count": 10}).execute()
         if res.data:
@@ -40,13 +57,17 @@ def format_tweet(deputy, position):
         f"A transparência é o primeiro passo para o voto consciente em 2026. 🇧🇷"
     ]
 
-def main():
-    client = SentinelAPIClient()
-    if not client.db: return
-
+def run_cycle(client):
+    """Executa um ciclo do bot: notícias primeiro, depois a fila de ranking."""
+    first_work = time.perf_counter() - _STARTED
+    metrics.gauge("startup_to_first_work_seconds", first_work)
+    print(f"Partida: importações em {IMPORT_SECONDS:.2f}s, primeiro trabalho em {first_work:.2f}s.")
+    # Threads pendentes de execuções anteriores seguem em segundo plano durante o ciclo
+    client.publishers.start()
     # 1. VERIFICAÇÃO DE NOTÍCIAS
     print("--- Verificando Notícias ---")
-    postou_noticia = run_news_bot()
+    with metrics.span("noticias"):
+        postou_noticia = run_news_bot(client)
     
     if postou_noticia:
         print("Ciclo finalizado com postagem de notícia.")
@@ -55,6 +76,10 @@ def main():
         print("Nenhuma notícia postada neste ciclo.")
 
     # 2. VERIFICAÇÃO DE RANKING
+    run_ranking(client)
+
+def run_ranking(client):
+    """Posta o próximo deputado da fila de ranking. Retorna True se a thread foi enfileirada."""
     print("\n--- Verificando Fila de Ranking ---")
     if datetime.datetime.now().weekday() == 0:
         queue = get_state(client, "ranking_queue")
@@ -65,12 +90,34 @@ def main():
         deputy = queue.pop()
         pos = len(queue) + 1
         print(f"Tentando postar ranking: {deputy['nome']} ({pos}º lugar)")
-        status = client.post_tweet_thread(format_tweet(deputy, pos))
-        if status not in ["rate_limit", None]:
+        with metrics.span("ranking.post"):
+            status = client.publish_thread(format_tweet(deputy, pos), origem="ranking")
+        if status:
             save_state(client, "ranking_queue", queue)
-            print("Postagem de ranking concluída com sucesso.")
+            print(f"Postagem de ranking enfileirada em: {', '.join(status)}.")
+            return True
     else:
         print("Fila de ranking vazia ou não é dia de gerar ranking.")
+    return False
+
+def main():
+    metrics.gauge("startup_import_seconds", IMPORT_SECONDS)
+    client = SentinelAPIClient()
+    if not client.db: return
+    if "--daemon" in sys.argv[1:]:
+        # Processo residente (python -m src.main --daemon) no lugar do cron horário
+        from src.servico import BotService
+        BotService(client, run_ranking).run()
+        return
+    try:
+        run_cycle(client)
+        with metrics.span("outbox.wait"):
+            client.publishers.wait(OUTBOX_MAX_WAIT)
+    finally:
+        # Grava em um único upsert todas as chaves de estado alteradas no ciclo
+        with metrics.span("state.commit"):
+            client.state.commit()
+        metrics.export("bot")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,131 @@
+"""Materializa rankings de gastos em várias dimensões e janelas a partir da tabela despesas."""
+import datetime
+import heapq
+from collections import defaultdict
+
+RANKING_INDEX_KEY = "ranking_index"
+WINDOWS = (7, 30, 90)
+DIMENSIONS = ("deputado", "partido", "uf", "tipo_despesa", "fornecedor")
+TOP_N = 10
+PAGE_SIZE = 1000
+# Idade máxima de um índice para ser usado: o sync é diário, com folga para atrasos do cron
+RANKING_MAX_AGE = 26 * 3600
+
+
+def _fetch_all(query_factory, page_size=PAGE_SIZE):
+    """Percorre uma consulta do Supabase em páginas (range) até esgotá-la."""
+    start = 0
+    while True:
+        rows = query_factory().range(start, start + page_size - 1).execute().data
+        yield from rows
+        if len(rows) < page_size: return
+        start += page_size
+
+
+def _row_date(row):
+    if row.get("data_emissao"): return row["data_emissao"][:10]
+    return f"{row['ano']}-{int(row['mes']):02d}-01"
+
+
+def build_ranking_index(deputies, expenses, today=None, windows=WINDOWS, top_n=TOP_N):
+    """
+    Calcula, em uma única passagem pelas despesas, o top-N de cada dimensão em cada janela.
+
+    Args:
+        deputies (list): Linhas de parlamentares (id, nome, sigla_partido, sigla_uf).
+        expenses (iterable): Linhas de despesas (deputado_id, data_emissao, ano, mes,
+            tipo_despesa, valor_liquido, nome_fornecedor, cnpj_cpf_fornecedor).
+
+    Returns:
+        dict: {"gerado_em", "janelas": {"7": {"deputado": [...], "partido": [...], ...}}}
+    """
+    today = today or datetime.date.today()
+    cutoffs = [(str(w), (today - datetime.timedelta(days=w)).isoformat()) for w in windows]
+    by_id = {d["id"]: d for d in deputies}
+    # totais[janela][dimensão][chave] = [total, quantidade]
+    totals = {w: {dim: defaultdict(lambda: [0.0, 0]) for dim in DIMENSIONS} for w, _ in cutoffs}
+    suppliers = {}
+
+    for row in expenses:
+        day = _row_date(row)
+        dep = by_id.get(row["deputado_id"], {})
+        supplier = row.get("cnpj_cpf_fornecedor") or row.get("nome_fornecedor") or "NÃO INFORMADO"
+        suppliers.setdefault(supplier, row.get("nome_fornecedor"))
+        keys = (row["deputado_id"], dep.get("sigla_partido") or "S/P", dep.get("sigla_uf") or "S/UF",
+                row.get("tipo_despesa") or "Outros", supplier)
+        value = float(row.get("valor_liquido") or 0)
+        for w, cutoff in cutoffs:
+            if day < cutoff: continue
+            for dim, key in zip(DIMENSIONS, keys):
+                acc = totals[w][dim][key]
+                acc[0] += value
+                acc[1] += 1
+
+    index = {"gerado_em": datetime.datetime.now(datetime.timezone.utc).isoformat(), "janelas": {}}
+    for w, dims in totals.items():
+        index["janelas"][w] = {}
+        for dim, acc in dims.items():
+            top = heapq.nlargest(top_n, acc.items(), key=lambda kv: kv[1][0])
+            entries = []
+            for key, (total, count) in top:
+                entry = {"chave": key, "total_gasto": round(total, 2), "quantidade": count}
+                if dim == "deputado":
+                    dep = by_id.get(key, {})
+                    entry.update(id=key, nome=dep.get("nome"), sigla_partido=dep.get("sigla_partido"),
+                                 sigla_uf=dep.get("sigla_uf"))
+                elif dim == "fornecedor":
+                    entry["nome"] = suppliers.get(key)
+                entries.append(entry)
+            index["janelas"][w][dim] = entries
+    return index
+
+
+def get_ranking(index, dimension="deputado", days=7, max_age=RANKING_MAX_AGE):
+    """Consulta O(1) de um ranking materializado. Retorna [] se não existir ou tiver mais de max_age s."""
+    if not index: return []
+    if max_age is not None:
+        try:
+            generated = datetime.datetime.fromisoformat(index["gerado_em"])
+        except (KeyError, TypeError, ValueError):
+            return []
+        if (datetime.datetime.now(datetime.timezone.utc) - generated).total_seconds() > max_age:
+            return []
+    return (index.get("janelas", {}).get(str(days), {}).get(dimension)) or []
+
+
+def window_filter(query, start_date):
+    """
+    Restringe a consulta às despesas a partir de start_date (ISO).
+
+    Despesas sem data_emissao contam pelo 1º dia do mês de competência (ver _row_date),
+    como na RPC get_top_spenders; o filtro do banco traz os meses candidatos e o corte
+    exato é feito ao agregar.
+    """
+    year, month = int(start_date[:4]), int(start_date[5:7])
+    return query.or_(f"data_emissao.gte.{start_date},"
+                     f"and(data_emissao.is.null,ano.gt.{year}),"
+                     f"and(data_emissao.is.null,ano.eq.{year},mes.gte.{month})")
+
+
+def materialize_rankings(client, windows=WINDOWS, top_n=TOP_N):
+    """Lê as despesas da maior janela, recalcula todos os rankings e grava o índice versionado."""
+    start_date = (datetime.date.today() - datetime.timedelta(days=max(windows))).isoformat()
+    try:
+        deputies = client.db.table("parlamentares").select("id, nome, sigla_partido, sigla_uf").execute().data
+        expenses = _fetch_all(lambda: window_filter(
+            client.db.table("despesas")
+            .select("deputado_id, data_emissao, ano, mes, tipo_despesa, valor_liquido, "
+                    "nome_fornecedor, cnpj_cpf_fornecedor"), start_date)
+            .order("id_externo"))
+        index = build_ranking_index(deputies, expenses, windows=windows, top_n=top_n)
+    except Exception as e:
+        print(f"Erro ao materializar rankings: {e}")
+        return None
+
+    previous = client.state.get(RANKING_INDEX_KEY) or {}
+    index["versao"] = previous.get("versao", 0) + 1
+    client.state.set(RANKING_INDEX_KEY, index)
+    if client.state.commit():
+        print(f"Índice de rankings v{index['versao']} gravado "
+              f"({len(windows)} janelas x {len(DIMENSIONS)} dimensões).")
+    return index
@@ -0,0 +1,137 @@
+"""Instrumentação das execuções: spans por etapa, histogramas de latência HTTP e contadores."""
+import datetime
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+METRICS_DIR = os.environ.get("METRICS_DIR", "metrics")
+# Limites (em segundos) dos baldes dos histogramas de duração
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MAX_SPANS = 5000
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """Registro de métricas de uma execução, seguro para uso a partir de várias threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Mede um trecho: guarda o span e alimenta o histograma stage_duration_seconds."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except Exception:
+            status = "erro"
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self.observe("stage_duration_seconds", duration, stage=name)
+            with self._lock:
+                if len(self.spans) < MAX_SPANS:
+                    self.spans.append({"nome": name, "inicio_s": round(start - self._t0, 4),
+                                       "duracao_s": round(duration, 4), "status": status, **labels})
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def observe_http(self, url, status, duration):
+        """Registra latência por host e contagem por código de status (ou "erro")."""
+        host = urlsplit(url).netloc
+        self.observe("http_request_duration_seconds", duration, host=host)
+        self.inc("http_responses_total", host=host, status=status)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "inicio": datetime.datetime.fromtimestamp(self.started_at, datetime.timezone.utc).isoformat(),
+                "duracao_s": round(time.perf_counter() - self._t0, 4),
+                "spans": list(self.spans),
+                "contadores": [{"nome": n, "rotulos": dict(l), "valor": v}
+                               for (n, l), v in sorted(self.counters.items())],
+                "medidores": [{"nome": n, "rotulos": dict(l), "valor": v}
+                              for (n, l), v in sorted(self.gauges.items())],
+                "histogramas": [{"nome": n, "rotulos": dict(l), "limites": list(BUCKETS), **h}
+                                for (n, l), h in sorted(self.histograms.items())],
+            }
+
+    def to_openmetrics(self):
+        """Exporta contadores e histogramas no formato de texto OpenMetrics."""
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items: return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted({n for n, _ in self.counters}):
+                lines.append(f"# TYPE sentinel_{name[:-6] if name.endswith('_total') else name} counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name: lines.append(f"sentinel_{n}{fmt(labels)} {value}")
+            for name in sorted({n for n, _ in self.gauges}):
+                lines.append(f"# TYPE sentinel_{name} gauge")
+                for (n, labels), value in sorted(self.gauges.items()):
+                    if n == name: lines.append(f"sentinel_{n}{fmt(labels)} {value:.6f}")
+            for name in sorted({n for n, _ in self.histograms}):
+                lines.append(f"# TYPE sentinel_{name} histogram")
+                for (n, labels), hist in sorted(self.histograms.items()):
+                    if n != name: continue
+                    for bound, count in zip(BUCKETS, hist["buckets"]):
+                        lines.append(f"sentinel_{n}_bucket{fmt(labels, [('le', bound)])} {count}")
+                    lines.append(f"sentinel_{n}_bucket{fmt(labels, [('le', '+Inf')])} {hist['count']}")
+                    lines.append(f"sentinel_{n}_sum{fmt(labels)} {hist['sum']:.6f}")
+                    lines.append(f"sentinel_{n}_count{fmt(labels)} {hist['count']}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def export(self, run_name, directory=None):
+        """Grava <run_name>-<timestamp>.json e .prom no diretório de métricas."""
+        directory = directory or METRICS_DIR
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        base = os.path.join(directory, f"{run_name}-{stamp}")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(base + ".json", "w", encoding="utf-8") as f:
+                json.dump({"execucao": run_name, **self.to_dict()}, f, ensure_ascii=False, indent=1)
+            with open(base + ".prom", "w", encoding="utf-8") as f:
+                f.write(self.to_openmetrics())
+            print(f"Métricas exportadas em {base}.json / .prom")
+        except OSError as e:
+            print(f"Erro ao exportar métricas: {e}")
+
+
+# Registro único do processo
+metrics = Metrics()
@@ -0,0 +1,139 @@
+"""Interface dos publicadores e distribuição das threads para todas as redes ativas."""
+import datetime
+import importlib
+import os
+import time
+from src.fila_postagem import OUTBOX_KEY, OUTBOX_MAX_PENDING, OUTBOX_MAX_WAIT, Outbox
+from src.metricas import metrics
+
+# Redes ativas, separadas por vírgula (x, bluesky, mastodon, telegram, local)
+PUBLISHERS = os.environ.get("PUBLISHERS", "x")
+# rede -> classe do publicador (módulo:classe), importada só se a rede estiver ativa
+REGISTRY = {
+    "x": "src.publicadores.x:XPublisher",
+    "bluesky": "src.publicadores.bluesky:BlueskyPublisher",
+    "mastodon": "src.publicadores.mastodon:MastodonPublisher",
+    "telegram": "src.publicadores.telegram:TelegramPublisher",
+    "local": "src.publicadores.local:LocalPublisher",
+}
+# Bloqueio usado quando uma rede responde 429 sem informar o reset (s)
+RATE_LIMIT_FALLBACK = 15 * 60
+
+
+class Publisher:
+    """
+    Uma rede de destino das threads.
+
+    Subclasses definem `name`, `configured()` e `send(texto, responder_a, raiz)`, que
+    retorna (status, id, liberado_em) com status em ok/rate_limit/duplicate/erro/sem_cliente.
+    `responder_a` e `raiz` são IDs devolvidos por envios anteriores da mesma thread.
+    A quarentena de rate limit fica no bot_state, em uma chave própria por rede.
+    """
+    name = None
+
+    def __init__(self, client):
+        self.client = client
+        self.state = client.state
+
+    @property
+    def lock_key(self):
+        return f"rate_limit_lock_{self.name}"
+
+    def configured(self):
+        raise NotImplementedError
+
+    def send(self, text, reply_to=None, root=None):
+        raise NotImplementedError
+
+    def available(self):
+        """Indica se a rede aceita uma thread nova agora (credenciais ok e fora de quarentena)."""
+        if self.lock_until():
+            print(f"[{self.name}] Em quarentena de rate limit; thread não enfileirada.")
+            return False
+        return True
+
+    def lock_until(self):
+        """Epoch até o qual o envio está bloqueado, ou None."""
+        lock_value = self.state.get(self.lock_key)
+        if not lock_value: return None
+        try:
+            lock_time = datetime.datetime.fromisoformat(lock_value).timestamp()
+        except ValueError:
+            return None
+        return lock_time if time.time() < lock_time else None
+
+    def set_lock(self, until):
+        self.state.set(self.lock_key, datetime.datetime.fromtimestamp(until, datetime.timezone.utc).isoformat())
+
+    def timed_send(self, text, reply_to=None, root=None):
+        """send() com métricas de latência e resultado por rede."""
+        start = time.perf_counter()
+        try:
+            status, post_id, free_at = self.send(text, reply_to, root)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"[{self.name}] Erro inesperado ao publicar: {e}")
+            status, post_id, free_at = "erro", None, None
+        metrics.observe("publish_seconds", time.perf_counter() - start, rede=self.name)
+        metrics.inc("publish_total", rede=self.name, status=status)
+        if status == "rate_limit":
+            free_at = free_at or time.time() + RATE_LIMIT_FALLBACK
+            self.set_lock(free_at)
+        return status, post_id, free_at
+
+
+class PublisherHub:
+    """
+    Distribui cada thread para as redes ativas, cada uma com o próprio outbox.
+
+    Cada outbox tem worker, quarentena e tentativas próprios: uma rede lenta ou
+    bloqueada não atrasa as outras.
+    """
+
+    def __init__(self, state, publishers):
+        self.publishers = [p for p in publishers if p.configured()]
+        self.outboxes = {
+            p.name: Outbox(state, p.timed_send, p.lock_until,
+                           key=OUTBOX_KEY if p.name == "x" else f"{p.name}_outbox", name=p.name)
+            for p in self.publishers
+        }
+
+    def publish(self, thread, origem=None):
+        """Enfileira a thread nas redes disponíveis. Retorna {rede: id do item} ou None se nenhuma aceitou."""
+        accepted = {}
+        for publisher in self.publishers:
+            outbox = self.outboxes[publisher.name]
+            if outbox.pending() >= OUTBOX_MAX_PENDING:
+                print(f"[{publisher.name}] Outbox com {outbox.pending()} thread(s) pendente(s); nova postagem adiada.")
+                continue
+            if not publisher.available(): continue
+            accepted[publisher.name] = outbox.enqueue(thread, origem)
+            outbox.start()
+        return accepted or None
+
+    def pending(self):
+        return sum(outbox.pending() for outbox in self.outboxes.values())
+
+    def start(self):
+        for outbox in self.outboxes.values():
+            outbox.start()
+
+    def wait(self, timeout=OUTBOX_MAX_WAIT):
+        """Espera todos os outboxes sob um prazo único. Retorna o total pendente."""
+        deadline = time.monotonic() + timeout
+        for outbox in self.outboxes.values():
+            outbox.join(max(0.0, deadline - time.monotonic()))
+        return sum(outbox.stop() for outbox in self.outboxes.values())
+
+
+def create_hub(client, names=PUBLISHERS):
+    """Instancia os publicadores listados em `names` e o hub que os alimenta."""
+    publishers = []
+    for name in (n.strip() for n in names.split(",")):
+        if not name: continue
+        if name not in REGISTRY:
+            print(f"Publicador desconhecido ignorado: {name}")
+            continue
+        module_name, class_name = REGISTRY[name].split(":")
+        cls = getattr(importlib.import_module(module_name), class_name)
+        publishers.append(cls(client))
+    return PublisherHub(client.state, publishers)
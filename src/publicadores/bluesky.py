@@ -0,0 +1,83 @@
+"""Publicador do Bluesky (AT Protocol), com login por senha de app."""
+import datetime
+import os
+import re
+import threading
+from src.publicadores.base import Publisher
+
+BLUESKY_PDS = os.environ.get("BLUESKY_PDS", "https://bsky.social")
+BLUESKY_HANDLE = os.environ.get("BLUESKY_HANDLE")
+BLUESKY_APP_PASSWORD = os.environ.get("BLUESKY_APP_PASSWORD")
+_URL_RE = re.compile(r"https?://[^\s]+")
+
+
+def link_facets(text):
+    """Facets de link do texto: o Bluesky não transforma URLs em links sozinho."""
+    facets = []
+    for match in _URL_RE.finditer(text):
+        start = len(text[:match.start()].encode("utf-8"))
+        facets.append({
+            "index": {"byteStart": start, "byteEnd": start + len(match.group().encode("utf-8"))},
+            "features": [{"$type": "app.bsky.richtext.facet#link", "uri": match.group()}],
+        })
+    return facets
+
+
+class BlueskyPublisher(Publisher):
+    name = "bluesky"
+
+    def __init__(self, client):
+        super().__init__(client)
+        self._session = None
+        self._lock = threading.Lock()
+
+    def configured(self):
+        return bool(BLUESKY_HANDLE and BLUESKY_APP_PASSWORD)
+
+    def _login(self, force=False):
+        import requests
+        with self._lock:
+            if self._session is None or force:
+                response = requests.post(f"{BLUESKY_PDS}/xrpc/com.atproto.server.createSession",
+                                         json={"identifier": BLUESKY_HANDLE, "password": BLUESKY_APP_PASSWORD},
+                                         timeout=15)
+                response.raise_for_status()
+                self._session = response.json()
+            return self._session
+
+    def send(self, text, reply_to=None, root=None):
+        import requests
+        record = {
+            "$type": "app.bsky.feed.post",
+            "text": text,
+            "createdAt": datetime.datetime.now(datetime.timezone.utc).isoformat().replace("+00:00", "Z"),
+            "langs": ["pt"],
+        }
+        facets = link_facets(text)
+        if facets: record["facets"] = facets
+        # IDs no Bluesky são {"uri", "cid"}; a resposta referencia a raiz e o post anterior
+        if reply_to: record["reply"] = {"root": root or reply_to, "parent": reply_to}
+        try:
+            for attempt in range(2):
+                session = self._login(force=attempt > 0)
+                response = requests.post(f"{BLUESKY_PDS}/xrpc/com.atproto.repo.createRecord",
+                                         headers={"Authorization": f"Bearer {session['accessJwt']}"},
+                                         json={"repo": session["did"], "collection": "app.bsky.feed.post",
+                                               "record": record},
+                                         timeout=15)
+                # Token de acesso vencido: novo login e uma nova tentativa
+                if response.status_code in (400, 401) and "ExpiredToken" in response.text: continue
+                break
+        except requests.RequestException as e:
+            print(f"[bluesky] Erro de conexão: {e}")
+            return "erro", None, None
+        if response.status_code == 429:
+            reset = response.headers.get("ratelimit-reset")
+            return "rate_limit", None, float(reset) if reset else None
+        if response.status_code != 200:
+            print(f"[bluesky] Erro {response.status_code}: {response.text[:200]}")
+            return "erro", None, None
+        data = response.json()
+        remaining, reset = response.headers.get("ratelimit-remaining"), response.headers.get("ratelimit-reset")
+        free_at = float(reset) if remaining == "0" and reset else None
+        return "ok", {"uri": data["uri"], "cid": data["cid"]}, free_at
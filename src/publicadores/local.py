@@ -0,0 +1,35 @@
+"""Publicador local para testes: grava as threads em um arquivo JSONL em vez de postar."""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from src.publicadores.base import Publisher
+
+PUBLISH_LOCAL_FILE = os.environ.get("PUBLISH_LOCAL_FILE", os.path.join(".cache", "publicacoes.jsonl"))
+# Latência simulada (s) e fração de envios que falham, para exercitar o outbox
+PUBLISH_LOCAL_DELAY = float(os.environ.get("PUBLISH_LOCAL_DELAY", "0"))
+PUBLISH_LOCAL_FAIL_RATE = float(os.environ.get("PUBLISH_LOCAL_FAIL_RATE", "0"))
+
+_lock = threading.Lock()
+
+
+class LocalPublisher(Publisher):
+    name = "local"
+
+    def configured(self):
+        return True
+
+    def send(self, text, reply_to=None, root=None):
+        if PUBLISH_LOCAL_DELAY: time.sleep(PUBLISH_LOCAL_DELAY)
+        if random.random() < PUBLISH_LOCAL_FAIL_RATE:
+            return "erro", None, None
+        post_id = uuid.uuid4().hex[:12]
+        record = {"id": post_id, "responder_a": reply_to, "raiz": root, "texto": text, "em": time.time()}
+        with _lock:
+            os.makedirs(os.path.dirname(PUBLISH_LOCAL_FILE) or ".", exist_ok=True)
+            with open(PUBLISH_LOCAL_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"[local] Publicado {post_id}: {text.splitlines()[0][:60]}")
+        return "ok", post_id, None
@@ -0,0 +1,45 @@
+"""Publicador do Mastodon (API REST da instância)."""
+import datetime
+import hashlib
+import os
+from src.publicadores.base import Publisher
+
+MASTODON_URL = os.environ.get("MASTODON_URL")
+MASTODON_TOKEN = os.environ.get("MASTODON_TOKEN")
+
+
+def _reset_epoch(value):
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+class MastodonPublisher(Publisher):
+    name = "mastodon"
+
+    def configured(self):
+        return bool(MASTODON_URL and MASTODON_TOKEN)
+
+    def send(self, text, reply_to=None, root=None):
+        import requests
+        # Idempotency-Key: uma nova tentativa após timeout não duplica o post
+        key = hashlib.sha1(f"{reply_to}|{text}".encode("utf-8")).hexdigest()
+        data = {"status": text, "visibility": "public", "language": "pt"}
+        if reply_to: data["in_reply_to_id"] = reply_to
+        try:
+            response = requests.post(f"{MASTODON_URL.rstrip('/')}/api/v1/statuses", data=data,
+                                     headers={"Authorization": f"Bearer {MASTODON_TOKEN}",
+                                              "Idempotency-Key": key},
+                                     timeout=15)
+        except requests.RequestException as e:
+            print(f"[mastodon] Erro de conexão: {e}")
+            return "erro", None, None
+        reset = _reset_epoch(response.headers.get("X-RateLimit-Reset"))
+        if response.status_code == 429:
+            return "rate_limit", None, reset
+        if response.status_code != 200:
+            print(f"[mastodon] Erro {response.status_code}: {response.text[:200]}")
+            return "erro", None, None
+        free_at = reset if response.headers.get("X-RateLimit-Remaining") == "0" else None
+        return "ok", response.json()["id"], free_at
@@ -0,0 +1,35 @@
+"""Publicador do Telegram (Bot API), enviando a thread como respostas encadeadas no canal."""
+import os
+import time
+from src.publicadores.base import Publisher
+
+TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
+
+
+class TelegramPublisher(Publisher):
+    name = "telegram"
+
+    def configured(self):
+        return bool(TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID)
+
+    def send(self, text, reply_to=None, root=None):
+        import requests
+        payload = {"chat_id": TELEGRAM_CHAT_ID, "text": text}
+        if reply_to:
+            payload["reply_to_message_id"] = reply_to
+            payload["allow_sending_without_reply"] = True
+        try:
+            response = requests.post(f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
+                                     json=payload, timeout=15)
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"[telegram] Erro de conexão: {e}")
+            return "erro", None, None
+        if response.status_code == 429:
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+            return "rate_limit", None, time.time() + retry_after if retry_after else None
+        if not data.get("ok"):
+            print(f"[telegram] Erro {response.status_code}: {data.get('description')}")
+            return "erro", None, None
+        return "ok", data["result"]["message_id"], None
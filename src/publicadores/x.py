@@ -0,0 +1,22 @@
+"""Publicador do X, sobre o cliente OAuth 2.0 do SentinelAPIClient."""
+from src.publicadores.base import Publisher
+
+
+class XPublisher(Publisher):
+    name = "x"
+    # Mesma chave usada antes dos demais publicadores
+    lock_key = "rate_limit_lock"
+
+    def configured(self):
+        return bool(self.client.client_id)
+
+    def available(self):
+        # A quarentena é verificada antes de autenticar: evita um refresh de token inútil
+        if not super().available(): return False
+        if not self.client.x_client:
+            print("Erro: X Client não inicializado. Verifique os tokens OAuth 2.0 no Supabase.")
+            return False
+        return True
+
+    def send(self, text, reply_to=None, root=None):
+        return self.client.send_tweet(text, reply_to)
@@ -0,0 +1,194 @@
+"""Modo serviço do bot: processo residente com coleta adaptativa dos feeds e endpoint local de saúde."""
+import datetime
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from main_noticias import NEWS_SOURCES, collect_news, run_news_bot
+from src.coletores.agenda_fontes import SourceSchedule
+from src.estado import STATE_KEYS
+from src.fila_postagem import OUTBOX_MAX_WAIT
+from src.materializador_ranking import RANKING_INDEX_KEY
+from src.metricas import metrics
+
+FEED_SCHEDULE_KEY = "feed_schedule"
+DAEMON_HEALTH_HOST = os.environ.get("DAEMON_HEALTH_HOST", "127.0.0.1")
+DAEMON_HEALTH_PORT = int(os.environ.get("DAEMON_HEALTH_PORT", "8787"))
+# Intervalo mínimo entre postagens (s), como no agendamento horário do cron
+DAEMON_POST_INTERVAL = float(os.environ.get("DAEMON_POST_INTERVAL", "3600"))
+# Horas (UTC) em que o bot posta; mesmas do cron: 09h às 21h de Brasília
+DAEMON_POST_HOURS_UTC = os.environ.get("DAEMON_POST_HOURS_UTC", "12-23,0")
+# Releitura periódica do bot_state, alterado também pelo sync diário (s)
+DAEMON_STATE_RELOAD = 3600
+DAEMON_MAX_SLEEP = 60
+# Campos da agenda que mudam a cada consulta; só os demais justificam gravar no bot_state
+VOLATILE_SCHEDULE_FIELDS = ("proximo", "ultima", "status")
+
+
+def parse_hours(spec):
+    """Converte "12-23,0" no conjunto de horas {12, ..., 23, 0}."""
+    hours = set()
+    for part in spec.split(","):
+        if not part.strip(): continue
+        start, _, end = part.partition("-")
+        hours.update(range(int(start), int(end or start) + 1))
+    return hours
+
+
+class BotService:
+    """
+    Laço do modo serviço.
+
+    Mantém o cliente (Supabase, X e sessões HTTP) aberto entre ciclos, consulta apenas
+    as fontes vencidas na SourceSchedule e tenta postar (notícia, senão ranking) quando
+    a janela de postagem está aberta. As últimas notícias de cada fonte ficam em memória
+    para que as não postadas continuem candidatas nos ciclos seguintes.
+    """
+
+    def __init__(self, client, run_ranking):
+        self.client = client
+        self.run_ranking = run_ranking
+        self.schedule = SourceSchedule([name for name, _ in NEWS_SOURCES],
+                                       client.state.get(FEED_SCHEDULE_KEY))
+        self.post_hours = parse_hours(DAEMON_POST_HOURS_UTC)
+        self.latest = {}
+        self.started = time.time()
+        self.last_tick = None
+        self.last_post = 0.0
+        self.last_attempt = 0.0
+        # Há notícias que ainda não passaram por uma tentativa de postagem
+        self.fresh = False
+        self.saved_schedule = self._durable(self.schedule.to_state())
+        self.last_reload = time.time()
+        self.ticks = self.errors = 0
+        self._stop = threading.Event()
+
+    def posting_open(self, now):
+        hour = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).hour
+        return hour in self.post_hours and now - self.last_post >= DAEMON_POST_INTERVAL
+
+    def should_attempt(self, now):
+        """Tenta postar só com notícias novas desde a última tentativa, ou uma vez por intervalo."""
+        return self.posting_open(now) and (self.fresh or now - self.last_attempt >= DAEMON_POST_INTERVAL)
+
+    @staticmethod
+    def _durable(schedule):
+        return {name: {k: v for k, v in s.items() if k not in VOLATILE_SCHEDULE_FIELDS}
+                for name, s in schedule.items()}
+
+    def tick(self):
+        now = time.time()
+        if now - self.last_reload >= DAEMON_STATE_RELOAD:
+            # Os outboxes são escritos só por este processo; as demais chaves podem ter mudado
+            self.client.state.reload([k for k in STATE_KEYS if not k.endswith("_outbox")] + [RANKING_INDEX_KEY])
+            self.last_reload = now
+
+        due = self.schedule.due(now)
+        if due:
+            with metrics.span("servico.coleta", fontes=len(due)):
+                _, report = collect_news(sources=due)
+            for name, result in report.items():
+                self.schedule.record(name, result["status"],
+                                     [n.get("published") for n in result["noticias"]])
+                if result["status"] in ("ok", "vazio"):
+                    known = {n.get("link") for n in self.latest.get(name, [])}
+                    if any(n.get("link") not in known for n in result["noticias"]): self.fresh = True
+                    self.latest[name] = result["noticias"]
+            for name, s in self.schedule.sources.items():
+                metrics.gauge("feed_poll_interval_seconds", s["intervalo"], fonte=name)
+            schedule = self.schedule.to_state()
+            durable = self._durable(schedule)
+            if durable != self.saved_schedule:
+                self.client.state.set(FEED_SCHEDULE_KEY, schedule)
+                self.saved_schedule = durable
+
+        if self.should_attempt(now):
+            self.last_attempt, self.fresh = now, False
+            news = [n for name, _ in NEWS_SOURCES for n in self.latest.get(name, [])]
+            with metrics.span("noticias"):
+                posted = bool(news) and run_news_bot(self.client, news)
+            if not posted:
+                posted = self.run_ranking(self.client)
+            if posted: self.last_post = now
+
+        # Sem chaves alteradas no ciclo, o commit não vai ao banco
+        self.client.state.commit()
+        self.client.publishers.start()
+        self.last_tick = time.time()
+        self.ticks += 1
+
+    def seconds_to_next(self):
+        return min(self.schedule.seconds_to_next(), DAEMON_MAX_SLEEP)
+
+    def health(self):
+        stale = self.last_tick is None or time.time() - self.last_tick > 3 * DAEMON_MAX_SLEEP
+        return {
+            "status": "atrasado" if stale else "ok",
+            "inicio": datetime.datetime.fromtimestamp(self.started, datetime.timezone.utc).isoformat(),
+            "uptime_s": round(time.time() - self.started),
+            "ciclos": self.ticks,
+            "erros": self.errors,
+            "ultimo_ciclo_s": None if self.last_tick is None else round(time.time() - self.last_tick),
+            "outbox_pendente": self.client.publishers.pending(),
+            "fontes": self.schedule.to_state(),
+        }
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        server = start_health_server(self)
+        logging.info("Modo serviço iniciado; saúde em http://%s:%d/health",
+                     DAEMON_HEALTH_HOST, DAEMON_HEALTH_PORT)
+        self.client.publishers.start()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.tick()
+                except Exception as e:  # pylint: disable=broad-except
+                    self.errors += 1
+                    metrics.inc("servico_errors_total")
+                    logging.error("Falha no ciclo do serviço: %s", e)
+                self._stop.wait(max(self.seconds_to_next(), 1))
+        finally:
+            logging.info("Encerrando o modo serviço.")
+            self.client.publishers.wait(OUTBOX_MAX_WAIT)
+            self.client.state.commit()
+            if server: server.shutdown()
+            metrics.export("servico")
+
+
+def start_health_server(service):
+    """Sobe /health (JSON) e /metrics (OpenMetrics) em uma thread. None se a porta estiver ocupada."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            if self.path == "/health":
+                data = service.health()
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                code, ctype = (200 if data["status"] == "ok" else 503), "application/json"
+            elif self.path == "/metrics":
+                body = metrics.to_openmetrics().encode("utf-8")
+                code, ctype = 200, "application/openmetrics-text; version=1.0.0; charset=utf-8"
+            else:
+                body, code, ctype = b"", 404, "text/plain"
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):  # pylint: disable=arguments-differ
+            pass
+
+    try:
+        server = ThreadingHTTPServer((DAEMON_HEALTH_HOST, DAEMON_HEALTH_PORT), Handler)
+    except OSError as e:
+        logging.error("Endpoint de saúde indisponível: %s", e)
+        return None
+    threading.Thread(target=server.serve_forever, name="health", daemon=True).start()
+    return server
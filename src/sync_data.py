@@ -1,15 +1,48 @@
 import os
 import datetime
+import hashlib
+import itertools
+import json
 import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from src.api_client import SentinelAPIClient
+from src.api_client import SentinelAPIClient, is_closed_month
+from src.escritor_despesas import ExpenseWriter
+from src.espelho_despesas import backfill_months, open_mirror
+from src.estatisticas_despesas import load_stats, save_stats
+from src.materializador_ranking import materialize_rankings
+from src.metricas import metrics
 
 load_dotenv()
 
+# Paralelismo da sincronização; a taxa de requisições é regulada por src.controle_taxa
+SYNC_WORKERS = int(os.environ.get("SYNC_WORKERS", "4"))
+
+# Modo incremental: marcas d'água por deputado/mês e checkpoint retomável no bot_state
+SYNC_INCREMENTAL = os.environ.get("SYNC_INCREMENTAL", "1") == "1"
+CHECKPOINT_KEY = "sync_checkpoint"
+CHECKPOINT_EVERY = 25
+# Idade máxima (dias) de uma marca d'água: depois disso o mês é baixado por inteiro, o
+# que pega correções em despesas antigas (valor, glosa) que não mudam a contagem
+SYNC_MARK_MAX_AGE_DAYS = int(os.environ.get("SYNC_MARK_MAX_AGE_DAYS", "7"))
+# Itens por página da API da Câmara (iter_deputy_expenses)
+PAGE_ITEMS = 100
+
+@lru_cache(maxsize=8192)
+def _normalize_label(value):
+    """strip().title() com cache: tipos e fornecedores se repetem muito entre as despesas."""
+    return value.strip().title()
+
+def _content_hash(e):
+    """Hash estável do conteúdo da despesa (o hash() do Python muda a cada processo)."""
+    raw = json.dumps(e, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
 def clean_expense(e, dep_id, year, month):
     """Camada de Limpeza (Silver): Normaliza e valida os dados da despesa."""
     # 1. Geração de ID Único determinístico
-    doc_id = e.get('idDocumento') or e.get('numDocumento') or str(hash(str(e)))
+    doc_id = e.get('idDocumento') or e.get('numDocumento') or _content_hash(e)
     lote = e.get('numLote') or '0'
     ext_id = f"{dep_id}_{doc_id}_{lote}"
 
@@ -17,10 +50,10 @@ def clean_expense(e, dep_id, year, month):
     return {
         "id_externo": ext_id,
         "deputado_id": dep_id,
-        "data_emissao": e.get("dataEmissao"),
-        "tipo_despesa": (e.get("tipoDespesa") or "OUTROS").strip().title(),
+        "data_emissao": e.get("dataEmissao") or e.get("dataDocumento"),
+        "tipo_despesa": _normalize_label(e.get("tipoDespesa") or "OUTROS"),
         "valor_liquido": float(e.get("valorLiquido") or 0),
-        "nome_fornecedor": (e.get("nomeFornecedor") or "NÃO INFORMADO").strip().title(),
+        "nome_fornecedor": _normalize_label(e.get("nomeFornecedor") or "NÃO INFORMADO"),
         "cnpj_cpf_fornecedor": e.get("cnpjCpfFornecedor"),
         "url_documento": e.get("urlDocumento"),
         "ano": year,
@@ -49,45 +82,243 @@ def sync_parliamentarians(client):
         print(f"Sucesso: {len(formatted)} parlamentares sincronizados.")
     except Exception as e:
         print(f"Erro parlamentares: {e}")
+    mirror = open_mirror()
+    if mirror: mirror.write_deputies(formatted)
+
+def _target_months(now, months_back):
+    """Lista (ano, mês) dos últimos meses, sem repetições."""
+    targets = [now - datetime.timedelta(days=m * 30) for m in range(months_back)]
+    return list(dict.fromkeys((t.year, t.month) for t in targets))
+
+def _month_key(year, month):
+    return f"{year}-{month:02d}"
+
+def load_checkpoint(client):
+    return client.state.get(CHECKPOINT_KEY) or {}
+
+def save_checkpoint(client, checkpoint):
+    client.state.set(CHECKPOINT_KEY, checkpoint)
+    if not client.state.commit():
+        print("Erro ao salvar checkpoint.")
+
+def _fetch_month(client, dep_id, year, month, mark=None):
+    """Busca e limpa as despesas de um deputado em um mês (executado nos workers).
+
+    Retorna (linhas, marca d'água, requisições feitas). Com uma marca anterior, meses
+    fechados são pulados e meses abertos só são baixados se a contagem ou a despesa
+    mais recente (data e codDocumento) mudou; nesses casos as linhas retornadas são None.
+    Marcas com mais de SYNC_MARK_MAX_AGE_DAYS dias, ou de meses com até uma página (a
+    verificação custaria o mesmo que a busca), não evitam a busca completa.
+    """
+    with metrics.span("sync.mes", deputado=dep_id, mes=_month_key(year, month)):
+        return _fetch_month_inner(client, dep_id, year, month, mark)
+
+def _fetch_month_inner(client, dep_id, year, month, mark):
+    closed = is_closed_month(year, month)
+    calls = 0
+    today = datetime.date.today()
+    if mark is not None:
+        if mark.get("fechado"):
+            return None, mark, calls
+        try:
+            age = (today - datetime.date.fromisoformat(mark["em"])).days
+        except (KeyError, TypeError, ValueError):
+            age = None
+        fresh = age is not None and age <= SYNC_MARK_MAX_AGE_DAYS
+        if not closed and fresh and (mark.get("linhas") or 0) > PAGE_ITEMS:
+            calls += 1
+            if _unchanged(mark, client.peek_deputy_expenses(dep_id, year, month)):
+                return None, mark, calls
+
+    # Limpa página a página conforme chegam: só as linhas limpas do mês ficam em memória
+    rows, latest_date, latest_doc = [], None, None
+    records = client.iter_deputy_expenses(dep_id, year, month, prefetch=True, raise_errors=True)
+    while True:
+        page = list(itertools.islice(records, PAGE_ITEMS))
+        if not page: break
+        for e in page:
+            latest_date, latest_doc = _newest(latest_date, latest_doc, e)
+        rows.extend(clean_expense(e, dep_id, year, month) for e in page)
+    calls += max(1, -(-len(rows) // PAGE_ITEMS))
+    new_mark = {"ultima_data": latest_date, "ultimo_doc": latest_doc, "linhas": len(rows),
+                "fechado": closed, "em": today.isoformat()}
+    return rows, new_mark, calls
+
+def _newest(date, doc, e):
+    """Atualiza (data, codDocumento) da despesa mais recente com a despesa e."""
+    candidate = (e.get("dataDocumento") or "", int(e.get("codDocumento") or 0))
+    if candidate > (date or "", doc or 0):
+        return candidate[0] or None, candidate[1] or None
+    return date, doc
+
+def _unchanged(mark, peek):
+    """Compara a marca com (total, despesa mais recente) do peek_deputy_expenses.
 
-def sync_all_expenses(client, months_back=2):
-    """Sincroniza despesas com deduplicação local."""
+    Pega inclusões, exclusões e a troca da despesa mais recente. Edições em despesas
+    antigas que mantêm a contagem só aparecem na próxima busca completa: quando a marca
+    passa de SYNC_MARK_MAX_AGE_DAYS dias ou na última execução antes de o mês sair da janela.
+    """
+    if peek is None or peek[0] != mark.get("linhas"): return False
+    if peek[1] is None: return True
+    date, doc = _newest(None, None, peek[1])
+    return (date, doc) == (mark.get("ultima_data"), mark.get("ultimo_doc"))
+
+def sync_all_expenses(client, months_back=2, workers=SYNC_WORKERS, max_rps=None,
+                      incremental=False):
+    """Sincroniza despesas com deduplicação local, buscando pares (deputado, mês) em paralelo.
+
+    No modo incremental, guarda no bot_state uma marca d'água por deputado/mês e a lista
+    de deputados já concluídos, permitindo retomar uma execução interrompida no mesmo dia.
+
+    Meses abertos com marca custam sempre uma consulta de verificação; só a busca completa
+    é evitada. Com o padrão months_back=2 os dois meses estão abertos (CAMARA_OPEN_MONTHS=4),
+    então a economia é de bytes baixados, não de requisições, e só em meses com mais de uma
+    página. Como um mês sai da janela antes de fechar, a última execução em que ele ainda
+    está na janela sempre o baixa por inteiro, e marcas antigas também forçam a busca completa.
+    """
     now = datetime.datetime.now()
     try:
         deputies = client.db.table("parlamentares").select("id, nome").execute().data
     except Exception: return
 
+    targets = _target_months(now, months_back)
+    target_keys = {_month_key(year, month) for year, month in targets}
+    # Meses que amanhã já estarão fora da janela: última chance de pegar correções
+    leaving = set(targets) - set(_target_months(now + datetime.timedelta(days=1), months_back))
+    checkpoint = load_checkpoint(client) if incremental else {}
+    # Só guarda marcas dos meses ainda dentro da janela de busca
+    marks = {dep: {k: v for k, v in months.items() if k in target_keys}
+             for dep, months in checkpoint.get("marcas", {}).items()}
+    run = checkpoint.get("execucao") or {}
+    if run.get("data") == now.date().isoformat():
+        completed = set(run.get("concluidos", []))
+        if completed:
+            print(f"Retomando execução interrompida: {len(completed)} deputados já concluídos.")
+    else:
+        completed = set()
+        run = {"data": now.date().isoformat()}
+    deputies = [dep for dep in deputies if str(dep["id"]) not in completed]
+
+    stats = load_stats(client)
+
+    def persist():
+        # As estatísticas vão no mesmo commit do checkpoint: meses marcados já foram contados
+        save_stats(client, stats, target_keys)
+        run["concluidos"] = sorted(completed)
+        save_checkpoint(client, {"marcas": marks, "execucao": run})
+
+    if max_rps: client.rate.max_rps = max_rps
     total = len(deputies)
-    print(f"Iniciando sincronização Silver de {total} deputados...")
-
-    for i, dep in enumerate(deputies):
-        dep_id, dep_name = dep["id"], dep["nome"]
-        expenses_batch = {} # Deduplicação por chave única no lote
-        
-        for m in range(months_back):
-            target = now - datetime.timedelta(days=m * 30)
-            raw_expenses = client.get_deputy_expenses(dep_id, target.year, target.month)
-            
-            for e in raw_expenses:
-                cleaned = clean_expense(e, dep_id, target.year, target.month)
-                # O dicionário garante que se o id_externo repetir no lote, ele é sobrescrito
-                expenses_batch[cleaned["id_externo"]] = cleaned
-
-        if expenses_batch:
+    print(f"Iniciando sincronização Silver de {total} deputados "
+          f"({workers} workers, {client.rate.rate:g} a {client.rate.max_rps:g} req/s"
+          f"{', incremental' if incremental else ''})...")
+    writer = ExpenseWriter(client.db)
+    mirror = open_mirror()
+    if mirror and incremental:
+        # Meses fora do espelho local (primeiro uso ou cache perdido) vêm do Supabase,
+        # já que as marcas d'água pulam os meses sem alteração
+        missing = set(targets) - mirror.months()
+        if missing:
+            print(f"Preenchendo o espelho colunar com {len(missing)} meses do Supabase...")
+            backfill_months(mirror, client.db, missing)
+    names = {dep["id"]: dep["nome"] for dep in deputies}
+    pending = {dep["id"]: len(targets) for dep in deputies}
+    batches = {dep["id"]: {} for dep in deputies} # Deduplicação por chave única no lote
+    new_marks = {dep["id"]: {} for dep in deputies}
+    failed = set()
+    n_requests = n_skipped = done = n_written = 0
+    start = time.monotonic()
+
+    def advance_marks():
+        # Marcas só avançam depois que as linhas do deputado foram gravadas
+        nonlocal n_written
+        for dep_id, ok in writer.poll():
+            if not ok: failed.add(dep_id)
+            if not incremental or dep_id in failed: continue
+            marks.setdefault(str(dep_id), {}).update(new_marks.pop(dep_id))
+            completed.add(str(dep_id))
+            n_written += 1
+            if n_written % CHECKPOINT_EVERY == 0: persist()
+
+    # A busca continua enquanto os blocos anteriores são gravados pelo ExpenseWriter
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {}
+        for dep in deputies:
+            dep_marks = marks.get(str(dep["id"]), {})
+            for year, month in targets:
+                mark = dep_marks.get(_month_key(year, month)) if incremental else None
+                if (year, month) in leaving: mark = None
+                future = pool.submit(_fetch_month, client, dep["id"], year, month, mark)
+                futures[future] = (dep["id"], year, month)
+
+        for future in as_completed(futures):
+            dep_id, year, month = futures[future]
+            month_key = _month_key(year, month)
             try:
-                data = list(expenses_batch.values())
-                client.db.table("despesas").upsert(data, on_conflict="id_externo").execute()
-                print(f"[{i+1}/{total}] {dep_name}: {len(data)} registros processados.")
+                rows, mark, calls = future.result()
+                n_requests += calls
+                new_marks[dep_id][month_key] = mark
+                if rows is None: n_skipped += 1
+                # O mês do deputado veio completo: substitui o que o espelho tinha dele
+                elif mirror: mirror.add(rows, replace=(dep_id, year, month))
+                if rows: stats.update(rows)
+                for cleaned in rows or []:
+                    # O dicionário garante que se o id_externo repetir no lote, ele é sobrescrito
+                    batches[dep_id][cleaned["id_externo"]] = cleaned
             except Exception as e:
-                print(f"Erro {dep_name}: {e}")
-        
-        time.sleep(0.3)
+                print(f"Erro ao buscar despesas de {names[dep_id]} ({month_key}): {e}")
+                failed.add(dep_id)
+
+            pending[dep_id] -= 1
+            if pending[dep_id]:
+                continue
+            done += 1
+            expenses_batch = batches.pop(dep_id)
+            writer.add(expenses_batch.values(), tag=dep_id)
+            if expenses_batch:
+                print(f"[{done}/{total}] {names[dep_id]}: {len(expenses_batch)} registros enfileirados.")
+            advance_marks()
+
+    writer.close()
+    advance_marks()
+    if mirror:
+        mirror.close()
+        # Só um sync sem falhas deixa os meses abertos do espelho em dia
+        if not failed: mirror.mark_updated()
+        print(f"Espelho colunar atualizado: {mirror.rows_written} linhas em {mirror.root}.")
+
+    if incremental:
+        if failed:
+            persist()
+        else:
+            # Execução completa: o próximo ciclo começa do zero, mantendo apenas as marcas
+            save_stats(client, stats, target_keys)
+            save_checkpoint(client, {"marcas": marks, "execucao": None})
+    else:
+        save_stats(client, stats, target_keys)
+        client.state.commit()
+
+    elapsed = max(time.monotonic() - start, 1e-9)
+    n_rows = writer.rows_written
+    print(f"Sincronização concluída em {elapsed:.1f}s: {n_requests} requisições "
+          f"({n_requests / elapsed:.2f} req/s), {n_rows} linhas gravadas ({n_rows / elapsed:.1f} linhas/s), "
+          f"{n_skipped} meses sem alteração, {writer.chunks_failed} blocos com falha; "
+          f"taxa final {client.rate.rate:.2f} req/s.")
+    print(f"Estatísticas: {stats.rows_added} despesas novas contabilizadas, "
+          f"{stats.flagged} anomalias detectadas.")
 
 def main():
     client = SentinelAPIClient()
     if not client.db: return
-    sync_parliamentarians(client)
-    sync_all_expenses(client)
+    try:
+        with metrics.span("sync.parlamentares"):
+            sync_parliamentarians(client)
+        with metrics.span("sync.despesas"):
+            sync_all_expenses(client, incremental=SYNC_INCREMENTAL)
+        with metrics.span("sync.rankings"):
+            materialize_rankings(client)
+    finally:
+        metrics.export("sync")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,127 @@
+"""Gerenciamento dos tokens OAuth 2.0 do X: reaproveita o access token e renova uma única vez."""
+import datetime
+import threading
+import time
+import uuid
+from src.metricas import metrics
+
+TOKENS_KEY = "twitter_tokens"
+LOCK_KEY = "twitter_tokens_lock"
+TOKEN_URL = "https://api.twitter.com/2/oauth2/token"
+SCOPES = ["tweet.read", "tweet.write", "users.read", "offline.access"]
+# Renova quando faltar menos que isto (s) para o access token expirar
+REFRESH_MARGIN = 300
+# Validade do lock de renovação (s) e espera máxima por outra execução que esteja renovando
+LOCK_TTL = 60
+LOCK_WAIT = 30
+
+# Lock do processo: o cliente cria um XTokenManager a cada reconstrução do cliente X,
+# então a serialização das renovações não pode depender da instância
+_refresh_lock = threading.Lock()
+
+
+class XTokenManager:
+    """
+    Fornece um access token válido do X a partir dos tokens guardados no bot_state.
+
+    O access token é reutilizado até REFRESH_MARGIN segundos antes de expirar. A renovação
+    é single-flight: dentro do processo por um threading.Lock do módulo, e entre execuções
+    concorrentes por uma linha de lock no bot_state criada com insert (falha se já
+    existir). Quem não obtém o lock espera e relê os tokens renovados pelo outro.
+    """
+
+    def __init__(self, db, state, client_id, client_secret, redirect_uri):
+        self.db = db
+        self.state = state
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self._owner = uuid.uuid4().hex
+
+    @staticmethod
+    def is_fresh(tokens):
+        expires_at = (tokens or {}).get("expires_at")
+        return bool(expires_at) and expires_at - time.time() > REFRESH_MARGIN
+
+    def access_token(self):
+        """Retorna um access token válido, renovando só se necessário. None se indisponível."""
+        tokens = self.state.get(TOKENS_KEY)
+        if not tokens:
+            print("Erro: Tokens OAuth 2.0 não encontrados no Supabase.")
+            return None
+        if self.is_fresh(tokens):
+            metrics.inc("x_token_total", origem="cache")
+            return tokens["access_token"]
+        with _refresh_lock:
+            return self._refresh_single_flight()
+
+    def _reload_tokens(self):
+        self.state.reload([TOKENS_KEY])
+        return self.state.get(TOKENS_KEY)
+
+    def _refresh_single_flight(self):
+        deadline = time.monotonic() + LOCK_WAIT
+        while True:
+            # Outra thread ou execução pode ter renovado enquanto esperávamos
+            tokens = self._reload_tokens()
+            if self.is_fresh(tokens):
+                metrics.inc("x_token_total", origem="outra_execucao")
+                return tokens["access_token"]
+            if self._acquire_lock():
+                try:
+                    tokens = self._reload_tokens()
+                    if self.is_fresh(tokens):
+                        return tokens["access_token"]
+                    return self._refresh(tokens)
+                finally:
+                    self._release_lock()
+            if time.monotonic() > deadline:
+                print("Erro: outra execução está renovando os tokens do X há tempo demais.")
+                return None
+            time.sleep(2)
+
+    def _refresh(self, tokens):
+        import tweepy
+        oauth2_handler = tweepy.OAuth2UserHandler(
+            client_id=self.client_id,
+            redirect_uri=self.redirect_uri,
+            scope=SCOPES,
+            client_secret=self.client_secret
+        )
+        with metrics.span("x.refresh_token"):
+            new_tokens = oauth2_handler.refresh_token(TOKEN_URL, refresh_token=tokens["refresh_token"])
+        metrics.inc("x_token_total", origem="refresh")
+        if not new_tokens.get("expires_at") and new_tokens.get("expires_in"):
+            new_tokens["expires_at"] = time.time() + float(new_tokens["expires_in"])
+        # Gravação imediata: o refresh token anterior já foi invalidado
+        self.state.set(TOKENS_KEY, dict(new_tokens))
+        if not self.state.commit():
+            print("Erro: não foi possível salvar os tokens renovados do X.")
+        return new_tokens["access_token"]
+
+    def _acquire_lock(self):
+        expires = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=LOCK_TTL)
+        value = {"dono": self._owner, "ate": expires.isoformat()}
+        try:
+            self.db.table("bot_state").insert({"key": LOCK_KEY, "value": value}).execute()
+            return True
+        except Exception:
+            pass
+        # Lock existente: se expirou (execução que morreu), remove apenas aquele dono e tenta de novo
+        try:
+            res = self.db.table("bot_state").select("value").eq("key", LOCK_KEY).execute()
+            if res.data:
+                held = res.data[0]["value"]
+                if datetime.datetime.fromisoformat(held["ate"]) >= datetime.datetime.now(datetime.timezone.utc):
+                    return False
+                self.db.table("bot_state").delete().eq("key", LOCK_KEY).eq("value->>dono", held["dono"]).execute()
+            self.db.table("bot_state").insert({"key": LOCK_KEY, "value": value}).execute()
+            return True
+        except Exception:
+            return False
+
+    def _release_lock(self):
+        try:
+            self.db.table("bot_state").delete().eq("key", LOCK_KEY).eq("value->>dono", self._owner).execute()
+        except Exception as e:
+            print(f"Erro ao liberar o lock de renovação do X: {e}")